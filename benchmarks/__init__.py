@@ -0,0 +1,163 @@
+"""
+Benchmark harness for the task modules. Run it with python -m benchmarks;
+see python -m benchmarks --help for sizes, baselines and thresholds.
+"""
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+
+RESULTS_FORMAT = 'task-benchmarks'
+RESULTS_VERSION = 1
+
+DEFAULT_SIZES = (10 ** 3, 10 ** 4, 10 ** 5)
+DEFAULT_REPEAT = 3
+# A benchmark regresses when its time or peak memory grows by more than this fraction.
+DEFAULT_THRESHOLD = 0.25
+
+# Registered benchmarks: name -> (fixture, prepare, max_size).
+BENCHMARKS = {}
+
+
+def benchmark(name, fixture, max_size=None):
+    """
+    Register prepare(data) as benchmark name. fixture(size) builds the data,
+    shared by every benchmark using the same fixture at that size. prepare
+    does any untimed setup and returns the zero-argument call to time.
+    Sizes above max_size are skipped.
+    """
+    def register(prepare):
+        BENCHMARKS[name] = (fixture, prepare, max_size)
+        return prepare
+    return register
+
+
+def _quietly(call):
+    with contextlib.redirect_stdout(io.StringIO()):
+        call()
+
+
+def measure(prepare, data, repeat=DEFAULT_REPEAT):
+    """
+    Best wall time of repeat runs, then the tracemalloc peak of one more run.
+    Each run gets a fresh call from prepare(data).
+    """
+    times = []
+    for _ in range(repeat):
+        call = prepare(data)
+        start = time.perf_counter()
+        _quietly(call)
+        times.append(time.perf_counter() - start)
+    call = prepare(data)
+    tracemalloc.start()
+    try:
+        _quietly(call)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(times), peak
+
+
+def run(sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, match=None, log=None):
+    """
+    Time every registered benchmark whose name contains match at each size.
+    Returns a JSON-serializable results document; log, if given, is called
+    with each result as it completes.
+    """
+    from benchmarks import cases  # noqa: F401  (registers the benchmarks)
+
+    results = []
+    for size in sizes:
+        # Fixtures live for one size at a time, so their memory is released between sizes.
+        fixtures = {}
+        for name, (fixture, prepare, max_size) in BENCHMARKS.items():
+            if (match and match not in name) or (max_size is not None and size > max_size):
+                continue
+            if fixture not in fixtures:
+                fixtures[fixture] = fixture(size)
+            seconds, peak = measure(prepare, fixtures[fixture], repeat)
+            result = {
+                'benchmark': name,
+                'size': size,
+                'seconds': seconds,
+                'peak_bytes': peak,
+                'items_per_second': size / seconds if seconds > 0 else None,
+            }
+            results.append(result)
+            if log:
+                log(result)
+    return {
+        'format': RESULTS_FORMAT,
+        'version': RESULTS_VERSION,
+        'created': datetime.now(timezone.utc).isoformat(),
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform(),
+        },
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def save_results(results, path):
+    with open(path, 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+
+def load_results(path):
+    with open(path) as results_file:
+        results = json.load(results_file)
+    if results.get('format') != RESULTS_FORMAT or results.get('version') != RESULTS_VERSION:
+        raise ValueError(f"Unsupported benchmark results: {path}")
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Regressions of results against a baseline run: benchmarks measured at
+    the same size in both whose time or peak memory grew by more than
+    threshold. Each regression is a dict naming the benchmark, size and
+    metric, with the baseline and current values and their ratio.
+    """
+    if threshold < 0:
+        raise ValueError("threshold must be non-negative")
+    previous = {(result['benchmark'], result['size']): result for result in baseline['results']}
+    regressions = []
+    for result in results['results']:
+        before = previous.get((result['benchmark'], result['size']))
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if before[metric] > 0 and result[metric] > before[metric] * (1 + threshold):
+                regressions.append({
+                    'benchmark': result['benchmark'],
+                    'size': result['size'],
+                    'metric': metric,
+                    'baseline': before[metric],
+                    'current': result[metric],
+                    'ratio': result[metric] / before[metric],
+                })
+    return regressions
+
+
+def unbenchmarked():
+    """Public methods and properties of the benchmarked classes that have no benchmark."""
+    from benchmarks import cases
+
+    # Variants of one method are registered as 'Class.method[variant]'.
+    covered = {name.split('[')[0] for name in BENCHMARKS}
+    missing = []
+    for cls in cases.BENCHMARKED_CLASSES:
+        for attribute in vars(cls):
+            if attribute.startswith('_') or attribute in cases.NOT_BENCHMARKED:
+                continue
+            if f"{cls.__name__}.{attribute}" not in covered:
+                missing.append(f"{cls.__name__}.{attribute}")
+    return missing
@@ -0,0 +1,61 @@
+import argparse
+import sys
+
+from benchmarks import (BENCHMARKS, DEFAULT_REPEAT, DEFAULT_SIZES, DEFAULT_THRESHOLD, compare, load_results, run,
+                        save_results, unbenchmarked)
+
+
+def _size(text):
+    """Parse sizes such as 1000, 1e6 or 1_000_000."""
+    size = int(float(text))
+    if size <= 0:
+        raise argparse.ArgumentTypeError("sizes must be positive")
+    return size
+
+
+def _print_result(result):
+    rate = result['items_per_second']
+    print(f"{result['benchmark']:<60} {result['size']:>12,} {result['seconds'] * 1e3:>12.3f} ms "
+          f"{result['peak_bytes'] / 2 ** 20:>10.2f} MiB {rate or 0:>12.3g}/s", flush=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                                     description="Time the public methods of the task classes across sizes.")
+    parser.add_argument('--sizes', nargs='+', type=_size, default=DEFAULT_SIZES,
+                        help="rows or elements per benchmark, e.g. 1e3 1e4 1e5 1e6 1e7 1e8")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help="timed runs per benchmark; the best is kept")
+    parser.add_argument('--match', help="only run benchmarks whose name contains this text")
+    parser.add_argument('--output', help="write the results as JSON to this path")
+    parser.add_argument('--baseline', help="compare against results saved earlier with --output")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="fractional growth in time or peak memory reported as a regression")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        from benchmarks import cases  # noqa: F401  (registers the benchmarks)
+        print('\n'.join(BENCHMARKS))
+        return 0
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    baseline = load_results(args.baseline) if args.baseline else None
+
+    for name in unbenchmarked():
+        print(f"warning: no benchmark for {name}", file=sys.stderr)
+    results = run(args.sizes, args.repeat, args.match, log=_print_result)
+    if args.output:
+        save_results(results, args.output)
+    if baseline is None:
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for regression in regressions:
+        print(f"REGRESSION {regression['benchmark']} at {regression['size']:,}: {regression['metric']} "
+              f"{regression['baseline']:.6g} -> {regression['current']:.6g} ({regression['ratio']:.2f}x)")
+    print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
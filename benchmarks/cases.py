@@ -0,0 +1,312 @@
+"""
+Benchmarks for every public method of the task classes. Sizes count
+transactions for ECommerceTransactions and array elements elsewhere.
+"""
+import os
+import tempfile
+from functools import partial
+
+import numpy as np
+
+from benchmarks import benchmark
+from tasks.array_advanced import ArrayAdvanced
+from tasks.array_data import DataHandler
+from tasks.basic_array import BasicArrayManipulator
+from tasks.ecommerce_transactions import COLUMNS, ECommerceTransactions
+
+BENCHMARKED_CLASSES = (ECommerceTransactions, DataHandler, ArrayAdvanced, BasicArrayManipulator)
+# Public methods that only print.
+NOT_BENCHMARKED = {'print_array'}
+
+# Methods returning the legacy object layout allocate a Python object per
+# cell, and text files take minutes to write, beyond these sizes.
+OBJECT_ROWS_MAX = 10 ** 6
+TEXT_SIZE_MAX = 10 ** 6
+
+ARRAY_COLUMNS = 10
+
+
+def _size(size):
+    return size
+
+
+def _shape(size):
+    return max(size // ARRAY_COLUMNS, 1), ARRAY_COLUMNS
+
+
+def _transactions(size):
+    return ECommerceTransactions.generate(size)
+
+
+def _cold(table):
+    """The table with its cached aggregates, indexes and running totals dropped."""
+    table._invalidate()
+    return table
+
+
+def _copy(table):
+    """An independent copy, for benchmarks that modify the table."""
+    return ECommerceTransactions({name: table.column(name).copy() for name in COLUMNS})
+
+
+class _TransactionStore:
+    def __init__(self, size):
+        self.table = _transactions(size)
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'store')
+        self.table.save(self.path)
+
+
+class _Snapshot:
+    """A snapshot cache already holding the generated dataset of this size."""
+
+    def __init__(self, size):
+        self.size = size
+        self.directory = tempfile.TemporaryDirectory()
+        ECommerceTransactions.generate(size, cache_dir=self.directory.name)
+
+
+class _ArrayFiles:
+    def __init__(self, size):
+        self.handler = DataHandler(_shape(size))
+        self.directory = tempfile.TemporaryDirectory()
+        self.base = os.path.join(self.directory.name, 'array')
+        formats = ('npy', 'blk') + (('txt', 'csv') if size <= TEXT_SIZE_MAX else ())
+        self.handler.save_array(self.base, formats)
+
+    def path(self, file_type):
+        return f"{self.base}.{file_type}"
+
+
+class _Catalog:
+    """Transactions over size // 5 products, with a catalog of every product attached."""
+
+    def __init__(self, size):
+        self.table = ECommerceTransactions.generate(size, n_products=max(size // 5, 1))
+        self.keys = np.arange(1, max(size // 5, 1) + 1)
+        self.categories = self.keys % 50
+        self.costs = np.round(self.keys % 1000 * 0.5, 2)
+        self.table.attach_dimension('product_id', self.keys, category=self.categories, cost=self.costs)
+
+
+def _advanced(size):
+    return ArrayAdvanced(_shape(size))
+
+
+def _tracked_advanced(size):
+    return ArrayAdvanced(_shape(size), track_views=True)
+
+
+def _manipulator(size):
+    manipulator = BasicArrayManipulator()
+    manipulator.one_dim_array = np.arange(1, size + 1)
+    manipulator.two_dim_array = np.arange(1, _shape(size)[0] * ARRAY_COLUMNS + 1).reshape(_shape(size))
+    return manipulator
+
+
+def _consume(iterator):
+    for _ in iterator:
+        pass
+
+
+# ECommerceTransactions: construction and storage
+
+benchmark('ECommerceTransactions.__init__', _size, max_size=1000)(
+    lambda size: ECommerceTransactions)
+benchmark('ECommerceTransactions.__init__[materialized]', _size, max_size=1000)(
+    lambda size: lambda: len(ECommerceTransactions()))
+benchmark('ECommerceTransactions.generate', _size)(
+    lambda size: lambda: ECommerceTransactions.generate(size))
+benchmark('ECommerceTransactions.generate[snapshot]', _Snapshot)(
+    lambda snapshot: partial(ECommerceTransactions.generate, snapshot.size, cache_dir=snapshot.directory.name))
+benchmark('ECommerceTransactions.generate_chunks', _size)(
+    lambda size: lambda: _consume(ECommerceTransactions.generate_chunks(size)))
+benchmark('ECommerceTransactions.save', _TransactionStore)(
+    lambda store: lambda: store.table.save(os.path.join(store.directory.name, 'saved')))
+benchmark('ECommerceTransactions.open', _TransactionStore)(
+    lambda store: lambda: ECommerceTransactions.open(store.path))
+benchmark('ECommerceTransactions.open[total_revenue]', _TransactionStore)(
+    lambda store: lambda: ECommerceTransactions.open(store.path).total_revenue())
+
+
+@benchmark('ECommerceTransactions.append', _transactions)
+def _append(table):
+    table = _copy(table)
+    table.total_revenue()
+    batch = ECommerceTransactions.generate(max(len(table) // 10, 1), seed=1)
+    batch = {name: batch.column(name) for name in COLUMNS if name != 'transaction_id'}
+    return lambda: table.append(batch)
+
+
+# ECommerceTransactions: accessors and indexes
+
+benchmark('ECommerceTransactions.transactions', _transactions, max_size=OBJECT_ROWS_MAX)(
+    lambda table: lambda: table.transactions)
+benchmark('ECommerceTransactions.column', _transactions)(
+    lambda table: lambda: table.column('price'))
+benchmark('ECommerceTransactions.id_dictionary', _transactions)(
+    lambda table: lambda: table.id_dictionary('user_id'))
+benchmark('ECommerceTransactions.check_data_types', _transactions)(
+    lambda table: table.check_data_types)
+benchmark('ECommerceTransactions.cache_info', _transactions)(
+    lambda table: table.cache_info)
+benchmark('ECommerceTransactions.build_time_index', _transactions)(
+    lambda table: _copy(table).build_time_index)
+benchmark('ECommerceTransactions.track_top_products', _transactions)(
+    lambda table: _copy(table).track_top_products)
+
+# ECommerceTransactions: aggregates, each from a cold cache
+
+benchmark('ECommerceTransactions.total_revenue', _transactions)(
+    lambda table: _cold(table).total_revenue)
+benchmark('ECommerceTransactions.total_revenue[workers=2]', _transactions)(
+    lambda table: partial(_cold(table).total_revenue, workers=2))
+benchmark('ECommerceTransactions.total_revenue[selection]', _transactions)(
+    lambda table: partial(table.total_revenue, selection=table.where(quantity__gt=5).selection()))
+benchmark('ECommerceTransactions.unique_users', _transactions)(
+    lambda table: _cold(table).unique_users)
+benchmark('ECommerceTransactions.most_purchased_product', _transactions)(
+    lambda table: _cold(table).most_purchased_product)
+benchmark('ECommerceTransactions.unique_users[approximate]', _transactions)(
+    lambda table: partial(_cold(table).unique_users, approximate=True))
+benchmark('ECommerceTransactions.most_purchased_product[approximate]', _transactions)(
+    lambda table: partial(_cold(table).most_purchased_product, approximate=True))
+benchmark('ECommerceTransactions.sketch_users', _transactions)(
+    lambda table: table.sketch_users)
+benchmark('ECommerceTransactions.sketch_products', _transactions)(
+    lambda table: table.sketch_products)
+benchmark('ECommerceTransactions.user_transaction_count', _transactions)(
+    lambda table: _cold(table).user_transaction_count)
+benchmark('ECommerceTransactions.product_quantity_array', _transactions)(
+    lambda table: table.product_quantity_array)
+benchmark('ECommerceTransactions.revenue_comparison', _transactions)(
+    lambda table: partial(_cold(table).revenue_comparison, 1709251200, 1719792000))
+benchmark('ECommerceTransactions.revenue_in_windows', _transactions)(
+    lambda table: lambda: table.revenue_in_windows(np.arange(1704067200, 1735689600, 30 * 86400)))
+benchmark('ECommerceTransactions.revenue_in_windows[by=product_id]', _transactions)(
+    lambda table: lambda: table.revenue_in_windows(np.arange(1704067200, 1735689600, 30 * 86400), by='product_id'))
+benchmark('ECommerceTransactions.revenue_by_period', _transactions)(
+    lambda table: partial(_cold(table).revenue_by_period, 'day'))
+benchmark('ECommerceTransactions.top_products', _transactions)(
+    lambda table: _cold(table).top_products)
+benchmark('ECommerceTransactions.get_readable_dates', _transactions, max_size=OBJECT_ROWS_MAX * 10)(
+    lambda table: table.get_readable_dates)
+
+# ECommerceTransactions: dimension joins
+
+benchmark('ECommerceTransactions.attach_dimension', _Catalog)(
+    lambda catalog: partial(catalog.table.attach_dimension, 'product_id', catalog.keys,
+                            category=catalog.categories, cost=catalog.costs))
+benchmark('ECommerceTransactions.joined_column', _Catalog)(
+    lambda catalog: partial(_cold(catalog.table).joined_column, 'category'))
+benchmark('ECommerceTransactions.revenue_by', _Catalog)(
+    lambda catalog: partial(_cold(catalog.table).revenue_by, 'category'))
+benchmark('ECommerceTransactions.revenue_by[margin]', _Catalog)(
+    lambda catalog: partial(_cold(catalog.table).revenue_by, 'category', cost='cost'))
+
+# ECommerceTransactions: filters
+
+benchmark('ECommerceTransactions.where', _transactions)(
+    lambda table: lambda: table.where(quantity__gt=5, ts__between=('2024-03-01', '2024-06-01'))
+    .agg(revenue=('revenue', 'sum')))
+benchmark('ECommerceTransactions.filter_transactions', _transactions)(
+    lambda table: table.filter_transactions)
+benchmark('ECommerceTransactions.masked_array_zero_quantity', _transactions, max_size=OBJECT_ROWS_MAX)(
+    lambda table: table.masked_array_zero_quantity)
+benchmark('ECommerceTransactions.user_transactions', _transactions)(
+    lambda table: partial(_cold(table).user_transactions, 1))
+benchmark('ECommerceTransactions.product_transactions', _transactions)(
+    lambda table: partial(_cold(table).product_transactions, 1))
+benchmark('ECommerceTransactions.users_transactions', _transactions)(
+    lambda table: partial(_cold(table).users_transactions, np.arange(1, 11)))
+benchmark('ECommerceTransactions.date_range_transactions', _transactions)(
+    lambda table: lambda: table.date_range_transactions('2024-06-01', '2024-07-01'))
+
+# ECommerceTransactions: modifications
+
+benchmark('ECommerceTransactions.convert_price_to_int', _transactions)(
+    lambda table: _copy(table).convert_price_to_int)
+
+
+@benchmark('ECommerceTransactions.increase_prices', _transactions)
+def _increase_prices(table):
+    table = _copy(table)
+    return lambda: table.increase_prices(5)
+
+
+@benchmark('ECommerceTransactions.increase_prices[per_product]', _transactions)
+def _increase_prices_per_product(table):
+    table = _copy(table)
+    percentages = np.linspace(-5, 5, int(table.column('product_id').max()) + 1)
+    return partial(table.increase_prices, percentages)
+
+
+# DataHandler
+
+benchmark('DataHandler.__init__', _size)(
+    lambda size: lambda: DataHandler(_shape(size)))
+benchmark('DataHandler.array', _size)(
+    lambda size: lambda: DataHandler(_shape(size)).array)
+for _file_type in ('txt', 'csv', 'npy', 'blk'):
+    _max_size = TEXT_SIZE_MAX if _file_type in ('txt', 'csv') else None
+    benchmark(f'DataHandler.save_array[{_file_type}]', _ArrayFiles, _max_size)(
+        lambda files, file_type=_file_type: lambda: files.handler.save_array(
+            os.path.join(files.directory.name, 'saved'), (file_type,)))
+    benchmark(f'DataHandler.load_array[{_file_type}]', _ArrayFiles, _max_size)(
+        lambda files, file_type=_file_type: lambda: DataHandler.load_array(files.path(file_type), file_type))
+for _file_type in ('csv', 'npy'):
+    _max_size = TEXT_SIZE_MAX if _file_type == 'csv' else None
+    benchmark(f'DataHandler.iter_chunks[{_file_type}]', _ArrayFiles, _max_size)(
+        lambda files, file_type=_file_type: lambda: _consume(DataHandler.iter_chunks(files.path(file_type), file_type)))
+    benchmark(f'DataHandler.stream_aggregates[{_file_type}]', _ArrayFiles, _max_size)(
+        lambda files, file_type=_file_type: lambda: DataHandler.stream_aggregates(files.path(file_type), file_type))
+benchmark('DataHandler.sum_array', _ArrayFiles)(lambda files: files.handler.sum_array)
+benchmark('DataHandler.mean_array', _ArrayFiles)(lambda files: files.handler.mean_array)
+benchmark('DataHandler.median_array', _ArrayFiles)(lambda files: files.handler.median_array)
+benchmark('DataHandler.std_array', _ArrayFiles)(lambda files: files.handler.std_array)
+for _axis in (None, 0, 1):
+    benchmark(f'DataHandler.axis_aggregates[axis={_axis}]', _ArrayFiles)(
+        lambda files, axis=_axis: lambda: files.handler.axis_aggregates(axis))
+
+# ArrayAdvanced
+
+benchmark('ArrayAdvanced.__init__', _size)(
+    lambda size: lambda: ArrayAdvanced(_shape(size)))
+benchmark('ArrayAdvanced.array', _size)(
+    lambda size: lambda: ArrayAdvanced(_shape(size)).array)
+benchmark('ArrayAdvanced.transpose', _advanced)(
+    lambda advanced: advanced.transpose)
+benchmark('ArrayAdvanced.transpose[out]', _advanced)(
+    lambda advanced: lambda: advanced.transpose(out=np.empty(advanced.array.shape[::-1], dtype=advanced.array.dtype)))
+benchmark('ArrayAdvanced.reshape', _advanced)(
+    lambda advanced: lambda: advanced.reshape((ARRAY_COLUMNS, -1)))
+benchmark('ArrayAdvanced.reshape[out]', _advanced)(
+    lambda advanced: lambda: advanced.reshape((ARRAY_COLUMNS, -1),
+                                              out=np.empty(advanced.array.shape[::-1], dtype=advanced.array.dtype)))
+benchmark('ArrayAdvanced.blocked_transpose', _advanced)(
+    lambda advanced: lambda: ArrayAdvanced.blocked_transpose(
+        advanced.array, np.empty(advanced.array.shape[::-1], dtype=advanced.array.dtype)))
+benchmark('ArrayAdvanced.blocked_reshape', _advanced)(
+    lambda advanced: lambda: ArrayAdvanced.blocked_reshape(
+        advanced.array, (ARRAY_COLUMNS, -1), np.empty(advanced.array.shape[::-1], dtype=advanced.array.dtype)))
+benchmark('ArrayAdvanced.split', _advanced)(
+    lambda advanced: lambda: advanced.split(ARRAY_COLUMNS, axis=1))
+benchmark('ArrayAdvanced.combine', _advanced)(
+    lambda advanced: lambda: advanced.combine(advanced.split(ARRAY_COLUMNS, axis=1), axis=1))
+benchmark('ArrayAdvanced.combine[track_views]', _tracked_advanced)(
+    lambda advanced: lambda: advanced.combine(advanced.split(2), axis=0))
+benchmark('ArrayAdvanced.copy_report', _tracked_advanced)(
+    lambda advanced: advanced.copy_report)
+
+# BasicArrayManipulator
+
+benchmark('BasicArrayManipulator.__init__', _size, max_size=1000)(
+    lambda size: BasicArrayManipulator)
+benchmark('BasicArrayManipulator.get_third_element', _manipulator)(
+    lambda manipulator: manipulator.get_third_element)
+benchmark('BasicArrayManipulator.get_first_two_rows_cols', _manipulator)(
+    lambda manipulator: manipulator.get_first_two_rows_cols)
+benchmark('BasicArrayManipulator.add_five_to_one_dim', _manipulator)(
+    lambda manipulator: manipulator.add_five_to_one_dim)
+benchmark('BasicArrayManipulator.multiply_two_dim_by_two', _manipulator)(
+    lambda manipulator: manipulator.multiply_two_dim_by_two)
@@ -1,10 +1,64 @@
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+try:
+    from tasks.lazy import LazyArray, concatenate
+except ImportError:  # run as a script: python tasks/array_advanced.py
+    from lazy import LazyArray, concatenate
+
+# Working-set budget per tile for the blocked out-of-core operations,
+# roughly one core's share of L2 cache.
+CACHE_BYTES = 1 << 20
+
+
+def _open_output(out, shape, dtype):
+    """Use out as given, or create a .npy-backed memmap if it is a path."""
+    if isinstance(out, str):
+        return np.lib.format.open_memmap(out, mode='w+', dtype=dtype, shape=shape)
+    if out.shape != tuple(shape):
+        raise ValueError(f"out has shape {out.shape}, expected {tuple(shape)}")
+    return out
+
+
+def _resolve_shape(size, shape):
+    """Fill in a -1 dimension of shape, as np.reshape would, and check the size."""
+    shape = (shape,) if isinstance(shape, int) else tuple(shape)
+    if -1 in shape:
+        known = int(np.prod([dim for dim in shape if dim != -1]))
+        shape = tuple(size // known if dim == -1 else dim for dim in shape)
+    if int(np.prod(shape)) != size:
+        raise ValueError(f"cannot reshape array of size {size} into shape {shape}")
+    return shape
+
 
 class ArrayAdvanced:
-    def __init__(self, shape=(6, 6)):
-        np.random.seed(42)
-        self.array = np.random.randint(1, 100, shape)
+    def __init__(self, shape=(6, 6), track_views=False, lazy=False):
+        # The array is drawn on first access; see the array property.
+        self._shape = shape
+        self._array = None
+        # In view-tracking mode combine() returns views where it can, and every
+        # operation logs how many bytes it copied.
+        self.track_views = track_views
+        self.copy_log = []
+        # In lazy mode operations return LazyArray nodes, evaluated by compute().
+        self.lazy = lazy
+        self._source = None
+
+    @property
+    def array(self):
+        """
+        The data array, generated on first access from a private generator
+        seeded with 42, so constructing an instance costs nothing and leaves
+        the global NumPy random state alone.
+        """
+        if self._array is None:
+            self._array = np.random.RandomState(42).randint(1, 100, self._shape)
+        return self._array
+
+    @array.setter
+    def array(self, value):
+        self._array = value
 
     @staticmethod
     def print_array(arr, message=None):
@@ -13,17 +67,140 @@ class ArrayAdvanced:
         print(arr)
         print()
 
-    def transpose(self):
-        return np.transpose(self.array)
+    def _lazy_source(self, out=None):
+        if out is not None:
+            raise ValueError("out= is not supported in lazy mode")
+        # Share one source node so split pieces can be recognized when recombined.
+        if self._source is None or self._source.params['array'] is not self.array:
+            self._source = LazyArray.source(self.array)
+        return self._source
+
+    def _record(self, operation, result, source=None):
+        """Log the bytes an operation copied: none if result shares memory with source."""
+        if self.track_views:
+            shared = source is not None and np.shares_memory(result, source)
+            self.copy_log.append((operation, 0 if shared else result.nbytes))
+        return result
+
+    def copy_report(self):
+        """Total bytes copied per operation since view tracking started."""
+        report = {}
+        for operation, nbytes in self.copy_log:
+            report[operation] = report.get(operation, 0) + nbytes
+        return report
+
+    def transpose(self, out=None):
+        if self.lazy:
+            return self._lazy_source(out).transpose()
+        if out is not None:
+            if self.array.ndim == 2:
+                return self._record('transpose', self.blocked_transpose(self.array, out))
+            np.copyto(out, np.transpose(self.array))
+            return self._record('transpose', out)
+        return self._record('transpose', np.transpose(self.array), self.array)
+
+    def reshape(self, new_shape, out=None):
+        if self.lazy:
+            return self._lazy_source(out).reshape(new_shape)
+        if out is not None:
+            return self._record('reshape', self.blocked_reshape(self.array, new_shape, out))
+        return self._record('reshape', np.reshape(self.array, new_shape), self.array)
 
-    def reshape(self, new_shape):
-        return np.reshape(self.array, new_shape)
+    @staticmethod
+    def blocked_transpose(source, out, tile=None, workers=None):
+        """
+        Transpose a 2-D array, typically an np.memmap larger than RAM, into out
+        (an array or a path for a new .npy memmap) one cache-sized tile at a time.
+        Each worker thread handles whole bands of source rows, so reads stay
+        sequential and only a few tiles are resident at once.
+        """
+        if source.ndim != 2:
+            raise ValueError("blocked_transpose needs a 2-D array")
+        rows, cols = source.shape
+        out = _open_output(out, (cols, rows), source.dtype)
+        tile = tile or max(16, int((CACHE_BYTES / (2 * source.itemsize)) ** 0.5))
+
+        def transpose_band(row_start):
+            row_stop = min(row_start + tile, rows)
+            for col_start in range(0, cols, tile):
+                col_stop = min(col_start + tile, cols)
+                out[col_start:col_stop, row_start:row_stop] = source[row_start:row_stop, col_start:col_stop].T
+
+        with ThreadPoolExecutor(max_workers=workers or 1) as executor:
+            list(executor.map(transpose_band, range(0, rows, tile)))
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
+
+    @staticmethod
+    def blocked_reshape(source, new_shape, out, block_bytes=CACHE_BYTES, workers=None):
+        """
+        Reshape source (C order) into out, an array or a path for a new .npy
+        memmap, copying blocks of whole leading-axis rows so memory stays
+        bounded even when source is a non-contiguous memmap view.
+        """
+        if source.ndim == 0:
+            raise ValueError("blocked_reshape needs at least one dimension")
+        out = _open_output(out, _resolve_shape(source.size, new_shape), source.dtype)
+        if not out.flags.c_contiguous:
+            raise ValueError("blocked_reshape needs a C-contiguous out array")
+        flat = out.reshape(-1)
+        row_size = source.size // len(source) if len(source) else 0
+        rows_per_block = max(1, block_bytes // max(1, row_size * source.itemsize))
+
+        def copy_block(row_start):
+            row_stop = min(row_start + rows_per_block, len(source))
+            flat[row_start * row_size:row_stop * row_size] = source[row_start:row_stop].reshape(-1)
+
+        with ThreadPoolExecutor(max_workers=workers or 1) as executor:
+            list(executor.map(copy_block, range(0, len(source), rows_per_block)))
+        if isinstance(out, np.memmap):
+            out.flush()
+        return out
 
     def split(self, num_splits, axis=0):
-        return np.split(self.array, num_splits, axis)
+        if self.lazy:
+            return self._lazy_source().split(num_splits, axis)
+        arrays = np.split(self.array, num_splits, axis)
+        for piece in arrays:
+            self._record('split', piece, self.array)
+        return arrays
+
+    def combine(self, arrays, axis=0, out=None):
+        if self.lazy:
+            self._lazy_source(out)
+            return concatenate(arrays, axis)
+        if self.track_views and out is None:
+            view = self._adjacent_view(arrays, axis)
+            if view is not None:
+                return self._record('combine', view, arrays[0])
+        return self._record('combine', np.concatenate(arrays, axis, out=out))
 
-    def combine(self, arrays, axis=0):
-        return np.concatenate(arrays, axis)
+    @staticmethod
+    def _adjacent_view(arrays, axis):
+        """
+        A view spanning arrays if they are consecutive, equally strided pieces
+        of the same buffer along axis (as produced by split), otherwise None.
+        """
+        if not arrays or not all(isinstance(piece, np.ndarray) for piece in arrays) or arrays[0].ndim == 0:
+            return None
+        first = arrays[0]
+        axis = axis % first.ndim
+        base = first if first.base is None else first.base
+        other_dims = first.shape[:axis] + first.shape[axis + 1:]
+        address = first.__array_interface__['data'][0]
+        for piece in arrays:
+            if ((piece if piece.base is None else piece.base) is not base
+                    or piece.dtype != first.dtype
+                    or piece.strides != first.strides
+                    or piece.shape[:axis] + piece.shape[axis + 1:] != other_dims
+                    or piece.__array_interface__['data'][0] != address):
+                return None
+            address += piece.shape[axis] * piece.strides[axis]
+        shape = list(first.shape)
+        shape[axis] = sum(piece.shape[axis] for piece in arrays)
+        return np.lib.stride_tricks.as_strided(first, shape=shape, strides=first.strides,
+                                               writeable=first.flags.writeable)
 
 
 def main():
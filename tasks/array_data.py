@@ -1,10 +1,114 @@
+import itertools
+import json
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 
+try:
+    from tasks.sketches import QuantileSketch
+except ImportError:  # run as a script: python tasks/array_data.py
+    from sketches import QuantileSketch
+
+# Block container layout: magic, zlib-compressed row blocks, a JSON index of
+# (offset, size, crc32) per block, then the index offset and the magic again.
+BLOCK_MAGIC = b'NPBLK001'
+BLOCK_FOOTER = struct.Struct('<Q8s')
+
+
+class RunningStats:
+    """
+    Single-pass, mergeable accumulator for count, sum, mean, std, min, max and an
+    approximate median. With axis=0 the statistics are kept per column of the 2-D
+    blocks passed to update(); with axis=None they cover all values.
+    Means and variances are merged with Chan's parallel form of Welford's update.
+    """
+
+    def __init__(self, axis=None, relative_accuracy=0.01):
+        if axis not in (None, 0):
+            raise ValueError("RunningStats reduces over axis None or 0")
+        self.axis = axis
+        self.relative_accuracy = relative_accuracy
+        self.count = 0
+        self.sum = self.mean = self.m2 = self.min = self.max = None
+        self.sketches = None
+
+    def update(self, block):
+        """Fold a block of values (rows of the full array when axis=0) into the statistics."""
+        block = np.asarray(block)
+        if self.axis is None:
+            block = block.reshape(-1, 1)
+        elif block.ndim != 2:
+            raise ValueError("Blocks must be 2-D when axis=0")
+        if len(block) == 0:
+            return
+
+        partial = RunningStats(self.axis, self.relative_accuracy)
+        partial.count = len(block)
+        partial.sum = np.sum(block, axis=0)
+        partial.mean = partial.sum / partial.count
+        partial.m2 = np.sum(np.square(block - partial.mean), axis=0)
+        partial.min = np.min(block, axis=0)
+        partial.max = np.max(block, axis=0)
+        partial.sketches = [QuantileSketch(self.relative_accuracy) for _ in range(block.shape[1])]
+        for sketch, column in zip(partial.sketches, block.T):
+            sketch.update(column)
+        self.merge(partial)
+
+    def merge(self, other):
+        """Fold the statistics of another accumulator, e.g. from another chunk or worker."""
+        if other.count == 0:
+            return
+        if self.count == 0:
+            self.count, self.sum, self.mean, self.m2 = other.count, other.sum, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            self.sketches = [QuantileSketch(self.relative_accuracy) for _ in other.sketches]
+        else:
+            count = self.count + other.count
+            delta = other.mean - self.mean
+            self.m2 = self.m2 + other.m2 + np.square(delta) * self.count * other.count / count
+            self.mean = self.mean + delta * other.count / count
+            self.sum = self.sum + other.sum
+            self.min = np.minimum(self.min, other.min)
+            self.max = np.maximum(self.max, other.max)
+            self.count = count
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+
+    def result(self):
+        """Return the statistics, as scalars for axis=None or per-column arrays for axis=0."""
+        if self.count == 0:
+            raise ValueError("No values have been added")
+        result = {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.mean,
+            'median': np.array([sketch.quantile(0.5) for sketch in self.sketches]),
+            'std': np.sqrt(self.m2 / self.count),
+            'min': self.min,
+            'max': self.max,
+        }
+        if self.axis is None:
+            result = {key: value if key == 'count' else value[0] for key, value in result.items()}
+        return result
+
 
 class DataHandler:
     def __init__(self, shape=(10, 10)):
-        np.random.seed(42)
-        self.array = np.random.randint(1, 100, shape)
+        self._shape = shape
+        self._array = None
+
+    @property
+    def array(self):
+        """Random integers in [1, 100), drawn on first access from a private RandomState(42)."""
+        if self._array is None:
+            self._array = np.random.RandomState(42).randint(1, 100, self._shape)
+        return self._array
+
+    @array.setter
+    def array(self, value):
+        self._array = value
 
     @staticmethod
     def print_array(arr, message=None):
@@ -14,20 +118,128 @@ class DataHandler:
         print()
 
     @staticmethod
-    def load_array(filename, file_type):
+    def load_array(filename, file_type, rows=None, workers=None):
         if file_type == 'txt':
             return np.loadtxt(filename)
         elif file_type == 'csv':
             return np.loadtxt(filename, delimiter=',')
         elif file_type == 'npy':
             return np.load(filename)
+        elif file_type == 'blk':
+            return DataHandler._read_blocks(filename, rows, workers)
         else:
             raise ValueError("Unsupported file type")
 
-    def save_array(self, filename_base):
-        np.savetxt(f"{filename_base}.txt", self.array)
-        np.savetxt(f"{filename_base}.csv", self.array, delimiter=',')
-        np.save(f"{filename_base}.npy", self.array)
+    @staticmethod
+    def _write_blocks(filename, array, rows_per_block, workers, level):
+        """
+        Write array as independently zlib-compressed blocks of rows_per_block rows.
+        zlib releases the GIL, so blocks are compressed on a thread pool,
+        a bounded batch at a time.
+        """
+        array = np.asarray(array)
+        if array.ndim == 0:
+            raise ValueError("Block files need at least one dimension")
+
+        def compress(start):
+            data = zlib.compress(np.ascontiguousarray(array[start:start + rows_per_block]).tobytes(), level)
+            return data, zlib.crc32(data)
+
+        starts = list(range(0, len(array), rows_per_block))
+        batch_size = 2 * (workers or 1)
+        blocks = []
+        with open(filename, 'wb') as file, ThreadPoolExecutor(max_workers=workers or 1) as executor:
+            file.write(BLOCK_MAGIC)
+            for batch_start in range(0, len(starts), batch_size):
+                for data, checksum in executor.map(compress, starts[batch_start:batch_start + batch_size]):
+                    blocks.append((file.tell(), len(data), checksum))
+                    file.write(data)
+            index_offset = file.tell()
+            file.write(json.dumps({
+                'dtype': array.dtype.str,
+                'shape': array.shape,
+                'rows_per_block': rows_per_block,
+                'blocks': blocks,
+            }).encode())
+            file.write(BLOCK_FOOTER.pack(index_offset, BLOCK_MAGIC))
+
+    @staticmethod
+    def _read_blocks(filename, rows=None, workers=None):
+        """
+        Read rows [start, stop) of a block file (all rows by default),
+        decoding only the blocks that overlap the range.
+        """
+        with open(filename, 'rb') as file:
+            file.seek(-BLOCK_FOOTER.size, 2)
+            index_offset, magic = BLOCK_FOOTER.unpack(file.read(BLOCK_FOOTER.size))
+            if magic != BLOCK_MAGIC:
+                raise ValueError(f"{filename} is not a block file")
+            file.seek(index_offset)
+            index = json.loads(file.read()[:-BLOCK_FOOTER.size])
+
+            dtype, shape, rows_per_block = np.dtype(index['dtype']), tuple(index['shape']), index['rows_per_block']
+            start, stop, _ = slice(*(rows or (None,))).indices(shape[0])
+            stop = max(start, stop)
+            first, last = start // rows_per_block, -(-stop // rows_per_block)
+            raw = []
+            for offset, size, checksum in index['blocks'][first:last]:
+                file.seek(offset)
+                raw.append((file.read(size), checksum))
+
+        def decompress(item):
+            data, checksum = item
+            if zlib.crc32(data) != checksum:
+                raise ValueError(f"Checksum mismatch in {filename}")
+            return np.frombuffer(zlib.decompress(data), dtype=dtype).reshape(-1, *shape[1:])
+
+        with ThreadPoolExecutor(max_workers=workers or 1) as executor:
+            blocks = list(executor.map(decompress, raw))
+        if not blocks:
+            return np.empty((0,) + shape[1:], dtype=dtype)
+        offset = first * rows_per_block
+        return np.concatenate(blocks)[start - offset:stop - offset]
+
+    @staticmethod
+    def iter_chunks(filename, file_type, rows_per_chunk=65536):
+        """
+        Yield the array stored in filename as typed blocks of at most
+        rows_per_chunk rows, holding only one block in memory at a time.
+        Text blocks are parsed by np.loadtxt's C reader; .npy files are memory-mapped.
+        """
+        if rows_per_chunk <= 0:
+            raise ValueError("rows_per_chunk must be positive")
+        if file_type == 'npy':
+            array = np.load(filename, mmap_mode='r')
+            for start in range(0, len(array), rows_per_chunk):
+                yield np.array(array[start:start + rows_per_chunk])
+        elif file_type in ('txt', 'csv'):
+            delimiter = ',' if file_type == 'csv' else None
+            with open(filename) as file:
+                while True:
+                    lines = list(itertools.islice(file, rows_per_chunk))
+                    if not lines:
+                        break
+                    yield np.loadtxt(lines, delimiter=delimiter, ndmin=2)
+        else:
+            raise ValueError("Unsupported file type")
+
+    def save_array(self, filename_base, formats=('txt', 'csv', 'npy'), rows_per_block=65536, workers=None,
+                   compression_level=6):
+        """
+        Save the array in each of formats. 'blk' is a block-compressed binary
+        container with per-block checksums that load_array can read by row range.
+        """
+        unsupported = set(formats) - {'txt', 'csv', 'npy', 'blk'}
+        if unsupported:
+            raise ValueError(f"Unsupported file type: {', '.join(sorted(unsupported))}")
+        if 'txt' in formats:
+            np.savetxt(f"{filename_base}.txt", self.array)
+        if 'csv' in formats:
+            np.savetxt(f"{filename_base}.csv", self.array, delimiter=',')
+        if 'npy' in formats:
+            np.save(f"{filename_base}.npy", self.array)
+        if 'blk' in formats:
+            self._write_blocks(f"{filename_base}.blk", self.array, rows_per_block, workers, compression_level)
 
     def sum_array(self):
         return np.sum(self.array)
@@ -42,13 +254,50 @@ class DataHandler:
         return np.std(self.array)
 
     def axis_aggregates(self, axis):
+        # Derive the mean from the sum and reuse it for the deviations,
+        # instead of letting np.mean and np.std each recompute it.
+        shape = self.array.shape
+        axes = range(len(shape)) if axis is None else [a % len(shape) for a in np.atleast_1d(axis)]
+        total = np.sum(self.array, axis=axis)
+        mean = total / np.prod([shape[a] for a in axes], dtype=np.int64)
+        deviations = self.array - np.reshape(mean, [1 if a in axes else n for a, n in enumerate(shape)])
         return {
-            'sum': np.sum(self.array, axis=axis),
-            'mean': np.mean(self.array, axis=axis),
+            'sum': total,
+            'mean': mean,
             'median': np.median(self.array, axis=axis),
-            'std': np.std(self.array, axis=axis)
+            'std': np.sqrt(np.mean(np.square(deviations), axis=axis))
+        }
+
+    @staticmethod
+    def _row_aggregates(block):
+        return {
+            'count': np.full(len(block), block.shape[1]),
+            'sum': np.sum(block, axis=1),
+            'mean': np.mean(block, axis=1),
+            'median': np.median(block, axis=1),
+            'std': np.std(block, axis=1),
+            'min': np.min(block, axis=1),
+            'max': np.max(block, axis=1),
         }
 
+    @classmethod
+    def stream_aggregates(cls, filename, file_type, axis=None, rows_per_chunk=65536, relative_accuracy=0.01):
+        """
+        Compute aggregates of an array on disk in a single chunked read.
+        For axis None or 0 the median is approximate, within relative_accuracy;
+        row aggregates (axis=1) are exact since every chunk holds whole rows.
+        """
+        if axis == 1:
+            chunks = [cls._row_aggregates(chunk) for chunk in cls.iter_chunks(filename, file_type, rows_per_chunk)]
+            if not chunks:
+                raise ValueError("No values have been added")
+            return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+        stats = RunningStats(axis, relative_accuracy)
+        for chunk in cls.iter_chunks(filename, file_type, rows_per_chunk):
+            stats.update(chunk)
+        return stats.result()
+
 
 def main():
     data = DataHandler()
@@ -1,10 +1,17 @@
 import numpy as np
 
+try:
+    from tasks.lazy import LazyArray
+except ImportError:  # run as a script: python tasks/basic_array.py
+    from lazy import LazyArray
+
 
 class BasicArrayManipulator:
-    def __init__(self):
+    def __init__(self, lazy=False):
         self.one_dim_array = np.arange(1, 11)
         self.two_dim_array = np.arange(1, 10).reshape(3, 3)
+        # In lazy mode arithmetic returns LazyArray nodes, evaluated by compute().
+        self.lazy = lazy
 
     @staticmethod
     def print_array(arr, message=None):
@@ -20,9 +27,13 @@ class BasicArrayManipulator:
         return self.two_dim_array[:2, :2]
 
     def add_five_to_one_dim(self):
+        if self.lazy:
+            return LazyArray.source(self.one_dim_array) + 5
         return self.one_dim_array + 5
 
     def multiply_two_dim_by_two(self):
+        if self.lazy:
+            return LazyArray.source(self.two_dim_array) * 2
         return self.two_dim_array * 2
 
 
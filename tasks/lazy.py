@@ -0,0 +1,142 @@
+import numpy as np
+
+LAYOUT_OPS = ('reshape', 'transpose')
+
+
+class LazyArray:
+    """
+    A deferred array expression. Operations build a graph of nodes, and
+    compute() evaluates it once: runs of reshapes/transposes collapse into a
+    single view computation, chains of scalar elementwise operations share one
+    output buffer, and a split followed by a combine of all its pieces in
+    order is skipped. Results may share memory with the source arrays.
+    """
+
+    def __init__(self, op, inputs=(), **params):
+        self.op = op
+        self.inputs = tuple(inputs)
+        self.params = params
+
+    @classmethod
+    def source(cls, array):
+        return cls('source', array=np.asarray(array))
+
+    def __repr__(self):
+        return f"LazyArray({self.op})"
+
+    def reshape(self, new_shape):
+        return LazyArray('reshape', [self], shape=new_shape)
+
+    def transpose(self, axes=None):
+        return LazyArray('transpose', [self], axes=axes)
+
+    def split(self, num_splits, axis=0):
+        return [LazyArray('split', [self], num_splits=num_splits, axis=axis, index=i) for i in range(num_splits)]
+
+    def _elementwise(self, ufunc, scalar):
+        if not np.isscalar(scalar):
+            return NotImplemented
+        return LazyArray('elementwise', [self], ufunc=ufunc, scalar=scalar)
+
+    def __add__(self, scalar):
+        return self._elementwise(np.add, scalar)
+
+    def __sub__(self, scalar):
+        return self._elementwise(np.subtract, scalar)
+
+    def __mul__(self, scalar):
+        return self._elementwise(np.multiply, scalar)
+
+    __radd__ = __add__
+    __rmul__ = __mul__
+
+    def compute(self):
+        """Evaluate the expression and return the resulting array."""
+        consumers = {}
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            for child in node.inputs:
+                if id(child) not in consumers:
+                    stack.append(child)
+                consumers[id(child)] = consumers.get(id(child), 0) + 1
+        return self._evaluate({}, consumers)[0]
+
+    def _evaluate(self, memo, consumers):
+        """
+        Return (value, owned). Owned values are temporaries created during this
+        computation that no other node reads, so they may be overwritten in place.
+        """
+        if id(self) not in memo:
+            memo[id(self)] = getattr(self, f"_evaluate_{self.op}")(memo, consumers)
+        value, owned = memo[id(self)]
+        return value, owned and consumers.get(id(self), 0) <= 1
+
+    def _chain(self, ops, consumers):
+        """Walk down the run of single-consumer nodes with an op in ops, ending at this node."""
+        chain = [self]
+        while chain[-1].inputs[0].op in ops and consumers[id(chain[-1].inputs[0])] == 1:
+            chain.append(chain[-1].inputs[0])
+        return chain[::-1], chain[-1].inputs[0]
+
+    def _evaluate_source(self, memo, consumers):
+        return self.params['array'], False
+
+    def _evaluate_layout(self, memo, consumers):
+        chain, below = self._chain(LAYOUT_OPS, consumers)
+        base, owned = below._evaluate(memo, consumers)
+        value = base
+        permutation = None
+        for i, node in enumerate(chain):
+            if node.op == 'transpose':
+                axes = node.params['axes']
+                axes = list(range(value.ndim))[::-1] if axes is None else list(axes)
+                permutation = axes if permutation is None else [permutation[axis] for axis in axes]
+            elif i + 1 == len(chain) or chain[i + 1].op != 'reshape':
+                # Only the last of consecutive reshapes matters.
+                if permutation is not None:
+                    value = np.transpose(value, permutation)
+                    permutation = None
+                value = np.reshape(value, node.params['shape'])
+        if permutation is not None:
+            value = np.transpose(value, permutation)
+        return value, owned or not np.shares_memory(value, base)
+
+    _evaluate_reshape = _evaluate_layout
+    _evaluate_transpose = _evaluate_layout
+
+    def _evaluate_elementwise(self, memo, consumers):
+        chain, below = self._chain(('elementwise',), consumers)
+        base, owned = below._evaluate(memo, consumers)
+        scalars = [node.params['scalar'] for node in chain]
+        dtype = np.result_type(base, *scalars)
+        out = base if owned and base.dtype == dtype and base.flags.writeable else np.empty(base.shape, dtype=dtype)
+        source = base
+        for node in chain:
+            node.params['ufunc'](source, node.params['scalar'], out=out)
+            source = out
+        return out, True
+
+    def _evaluate_split(self, memo, consumers):
+        value, _ = self.inputs[0]._evaluate(memo, consumers)
+        return np.split(value, self.params['num_splits'], self.params['axis'])[self.params['index']], False
+
+    def _evaluate_concatenate(self, memo, consumers):
+        axis = self.params['axis']
+        parent = self.inputs[0].inputs[0] if self.inputs[0].op == 'split' else None
+        if parent is not None and all(node.op == 'split'
+                                      and node.inputs[0] is parent
+                                      and node.params['axis'] == axis
+                                      and node.params['index'] == i
+                                      and node.params['num_splits'] == len(self.inputs)
+                                      for i, node in enumerate(self.inputs)):
+            value, _ = parent._evaluate(memo, consumers)
+            return value, False
+        values = [node._evaluate(memo, consumers)[0] for node in self.inputs]
+        return np.concatenate(values, axis), True
+
+
+def concatenate(arrays, axis=0):
+    """Deferred np.concatenate of LazyArray nodes and/or concrete arrays."""
+    nodes = [array if isinstance(array, LazyArray) else LazyArray.source(array) for array in arrays]
+    return LazyArray('concatenate', nodes, axis=axis)
@@ -0,0 +1,251 @@
+import numpy as np
+
+# Multipliers of the SplitMix64 mixing function.
+_GOLDEN = np.uint64(0x9E3779B97F4A7C15)
+_MIX1 = np.uint64(0xBF58476D1CE4E5B9)
+_MIX2 = np.uint64(0x94D049BB133111EB)
+
+
+def _hash64(values, seed=0):
+    """
+    Well-mixed 64-bit hashes of integer values (SplitMix64), as uint64.
+    Different seeds give independent hash functions.
+    """
+    hashes = np.asarray(values).astype(np.int64).view(np.uint64).ravel()
+    # Offset by a seed-dependent constant; uint64 array arithmetic wraps.
+    hashes = hashes + _GOLDEN * np.full(1, seed + 1, dtype=np.uint64)
+    shifted = np.empty_like(hashes)
+    for shift, multiplier in ((30, _MIX1), (27, _MIX2), (31, None)):
+        hashes ^= np.right_shift(hashes, np.uint64(shift), out=shifted)
+        if multiplier is not None:
+            hashes *= multiplier
+    return hashes
+
+
+def _bit_length(values):
+    """Bit length of each uint64 value, exactly, via float exponents of 32-bit halves."""
+    high = (values >> np.uint64(32)).astype(np.float64)
+    low = (values & np.uint64(0xFFFFFFFF)).astype(np.float64)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def _merge_counts(keys_a, counts_a, keys_b, counts_b):
+    """Merge two sparse (sorted keys, counts) histograms."""
+    keys, inverse = np.unique(np.concatenate((keys_a, keys_b)), return_inverse=True)
+    counts = np.zeros(len(keys), dtype=np.int64)
+    np.add.at(counts, inverse, np.concatenate((counts_a, counts_b)))
+    return keys, counts
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with a relative error guarantee (DDSketch).
+    Values are counted in logarithmic buckets, so any estimated quantile is
+    within relative_accuracy of a value of the requested rank.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(self._gamma)
+        self._positive = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        self._negative = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64))
+        self._zeros = 0
+
+    @property
+    def count(self):
+        return int(self._positive[1].sum() + self._negative[1].sum() + self._zeros)
+
+    def _bucket_counts(self, magnitudes):
+        keys = np.ceil(np.log(magnitudes) / self._log_gamma).astype(np.int64)
+        return np.unique(keys, return_counts=True)
+
+    def update(self, values):
+        """Add an array of values in one vectorized pass. NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[~np.isnan(values)]
+        self._positive = _merge_counts(*self._positive, *self._bucket_counts(values[values > 0]))
+        self._negative = _merge_counts(*self._negative, *self._bucket_counts(-values[values < 0]))
+        self._zeros += int(np.count_nonzero(values == 0))
+
+    def merge(self, other):
+        """Fold another sketch with the same relative_accuracy into this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches with different relative_accuracy")
+        self._positive = _merge_counts(*self._positive, *other._positive)
+        self._negative = _merge_counts(*self._negative, *other._negative)
+        self._zeros += other._zeros
+
+    def quantile(self, q):
+        """Estimate the value of rank q * (count - 1)."""
+        if not 0 <= q <= 1:
+            raise ValueError("q must be between 0 and 1")
+        if self.count == 0:
+            return np.nan
+        # Buckets in ascending value order: negatives (largest key first), zeros, positives.
+        negative_keys, negative_counts = self._negative
+        positive_keys, positive_counts = self._positive
+        bucket_values = np.concatenate((
+            -self._bucket_value(negative_keys[::-1]),
+            [0.0],
+            self._bucket_value(positive_keys),
+        ))
+        counts = np.concatenate((negative_counts[::-1], [self._zeros], positive_counts))
+        rank = q * (self.count - 1)
+        return bucket_values[np.searchsorted(np.cumsum(counts), rank, side='right')]
+
+    def _bucket_value(self, keys):
+        return 2 * self._gamma ** keys.astype(np.float64) / (self._gamma + 1)
+
+
+class HyperLogLog:
+    """
+    Mergeable distinct-count sketch (HyperLogLog) over integer ids, in
+    2 ** precision one-byte registers whatever the number of ids. Estimates
+    have a relative standard error of about 1.04 / sqrt(2 ** precision),
+    0.8% at the default precision.
+    """
+
+    def __init__(self, precision=14):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision = precision
+        self._registers = np.zeros(1 << precision, dtype=np.uint8)
+
+    @property
+    def standard_error(self):
+        """Relative standard error of count()."""
+        return 1.04 / np.sqrt(len(self._registers))
+
+    def update(self, values):
+        """Add an array of integer ids in one vectorized pass."""
+        hashes = _hash64(values)
+        # The top bits pick a register, which keeps the longest run of
+        # leading zeros (plus one) seen in the remaining bits.
+        suffix_bits = 64 - self.precision
+        registers = (hashes >> np.uint64(suffix_bits)).astype(np.intp)
+        suffixes = hashes & np.uint64((1 << suffix_bits) - 1)
+        ranks = (suffix_bits + 1 - _bit_length(suffixes)).astype(np.uint8)
+        np.maximum.at(self._registers, registers, ranks)
+
+    def merge(self, other):
+        """Fold another sketch with the same precision into this one."""
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        np.maximum(self._registers, other._registers, out=self._registers)
+
+    def count(self):
+        """Estimated number of distinct ids added."""
+        m = len(self._registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self._registers.astype(np.int64)))
+        empty = np.count_nonzero(self._registers == 0)
+        if estimate <= 2.5 * m and empty:
+            # Linear counting is more accurate while many registers are empty.
+            estimate = m * np.log(m / empty)
+        return int(round(estimate))
+
+
+class CountMinSketch:
+    """
+    Mergeable frequency sketch (Count-Min) over integer ids. Estimates never
+    undercount, and overcount by at most error_bound() = epsilon times the
+    total count with probability at least 1 - delta, in a fixed
+    ceil(e / epsilon) by ceil(ln(1 / delta)) table of counters.
+    """
+
+    def __init__(self, epsilon=0.001, delta=0.01):
+        if not 0 < epsilon < 1 or not 0 < delta < 1:
+            raise ValueError("epsilon and delta must be between 0 and 1")
+        self.epsilon = epsilon
+        self.delta = delta
+        self._table = np.zeros((int(np.ceil(np.log(1 / delta))), int(np.ceil(np.e / epsilon))), dtype=np.int64)
+        self.total = 0
+
+    def _columns(self, values):
+        width = np.uint64(self._table.shape[1])
+        return [(_hash64(values, seed=row) % width).astype(np.intp) for row in range(len(self._table))]
+
+    def update(self, values, counts=None):
+        """Add integer ids, each counted once or by the matching entry of counts."""
+        values = np.asarray(values).ravel()
+        counts = np.ones(len(values), dtype=np.int64) if counts is None else np.asarray(counts, dtype=np.int64).ravel()
+        if len(counts) != len(values):
+            raise ValueError("counts must have one entry per value")
+        for row, columns in zip(self._table, self._columns(values)):
+            row += np.bincount(columns, weights=counts, minlength=len(row)).astype(np.int64)
+        self.total += int(counts.sum())
+
+    def merge(self, other):
+        """Fold another sketch with the same epsilon and delta into this one."""
+        if other._table.shape != self._table.shape:
+            raise ValueError("Cannot merge sketches with different epsilon or delta")
+        self._table += other._table
+        self.total += other.total
+
+    def estimate(self, values):
+        """Estimated counts of an array of integer ids."""
+        columns = self._columns(values)
+        return np.min([row[column] for row, column in zip(self._table, columns)], axis=0)
+
+    def error_bound(self):
+        """Overcount that estimates stay within with probability 1 - delta."""
+        return self.epsilon * self.total
+
+
+class HeavyHitters:
+    """
+    Mergeable heavy-hitter summary keeping at most capacity counters
+    (Misra-Gries, the decrementing form of space-saving). Each batch is
+    counted exactly, merged in, and pruned by subtracting the
+    (capacity + 1)-th largest count. An item's true count lies in
+    [count, count + error_bound()], and error_bound() never exceeds
+    total / (capacity + 1), so every item more frequent than that is kept.
+    """
+
+    def __init__(self, capacity=1024):
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self._keys = np.zeros(0, dtype=np.int64)
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._error = 0
+        self.total = 0
+
+    def update(self, values, counts=None):
+        """Add integer ids, each counted once or by the matching entry of counts."""
+        values = np.asarray(values, dtype=np.int64).ravel()
+        if counts is None:
+            keys, batch_counts = np.unique(values, return_counts=True)
+        else:
+            counts = np.asarray(counts, dtype=np.int64).ravel()
+            if len(counts) != len(values):
+                raise ValueError("counts must have one entry per value")
+            keys, inverse = np.unique(values, return_inverse=True)
+            batch_counts = np.bincount(inverse.reshape(-1), weights=counts, minlength=len(keys)).astype(np.int64)
+        self._merge(keys, batch_counts.astype(np.int64), 0, int(batch_counts.sum()))
+
+    def merge(self, other):
+        """Fold another summary into this one, keeping this one's capacity."""
+        self._merge(other._keys, other._counts, other._error, other.total)
+
+    def _merge(self, keys, counts, error, total):
+        self._keys, self._counts = _merge_counts(self._keys, self._counts, keys, counts)
+        self._error += error
+        self.total += total
+        if len(self._keys) > self.capacity:
+            cut = np.partition(self._counts, -(self.capacity + 1))[-(self.capacity + 1)]
+            kept = self._counts > cut
+            self._keys, self._counts = self._keys[kept], self._counts[kept] - cut
+            self._error += int(cut)
+
+    def error_bound(self):
+        """Most that any item's count may fall short of its true count."""
+        return self._error
+
+    def top(self, n=None):
+        """The n (default all) monitored ids with the largest counts, and their counts."""
+        order = np.argsort(-self._counts, kind='stable')[:n]
+        return self._keys[order], self._counts[order]
@@ -1,3 +1,5 @@
+import os
+import tempfile
 import unittest
 import numpy as np
 from tasks.array_advanced import ArrayAdvanced
@@ -11,6 +13,17 @@ class TestArrayAdvanced(unittest.TestCase):
     def test_initial_array(self):
         self.assertEqual(self.manipulator.array.shape, (6, 6))
 
+    def test_array_is_built_lazily_without_reseeding(self):
+        np.random.seed(0)
+        state = np.random.get_state()[1].copy()
+        lazy = ArrayAdvanced((4, 5))
+        self.assertIsNone(lazy._array)
+        np.random.seed(42)
+        np.testing.assert_array_equal(lazy.array, np.random.randint(1, 100, (4, 5)))
+        np.random.seed(0)
+        ArrayAdvanced().array
+        np.testing.assert_array_equal(np.random.get_state()[1], state)
+
     def test_transpose(self):
         transposed = self.manipulator.transpose()
         np.testing.assert_array_equal(transposed, self.manipulator.array.T)
@@ -31,6 +44,70 @@ class TestArrayAdvanced(unittest.TestCase):
         combined = self.manipulator.combine(split_arrays)
         np.testing.assert_array_equal(combined, self.manipulator.array)
 
+    def test_combine_returns_view_when_tracking(self):
+        tracker = ArrayAdvanced(track_views=True)
+        for axis in [0, 1]:
+            combined = tracker.combine(tracker.split(3, axis=axis), axis=axis)
+            np.testing.assert_array_equal(combined, tracker.array)
+            self.assertTrue(np.shares_memory(combined, tracker.array))
+        self.assertEqual(tracker.copy_report(), {'split': 0, 'combine': 0})
+
+        reordered = tracker.combine(tracker.split(3)[::-1])
+        self.assertFalse(np.shares_memory(reordered, tracker.array))
+        self.assertEqual(tracker.copy_report()['combine'], tracker.array.nbytes)
+
+    def test_combine_copies_by_default(self):
+        combined = self.manipulator.combine(self.manipulator.split(3))
+        self.assertFalse(np.shares_memory(combined, self.manipulator.array))
+        self.assertEqual(self.manipulator.copy_log, [])
+
+    def test_out_parameter(self):
+        out = np.empty((6, 6), dtype=self.manipulator.array.dtype)
+        self.assertIs(self.manipulator.combine(self.manipulator.split(2), out=out), out)
+        np.testing.assert_array_equal(out, self.manipulator.array)
+        self.assertIs(self.manipulator.transpose(out=out), out)
+        np.testing.assert_array_equal(out, self.manipulator.array.T)
+        reshaped = np.empty((3, 12), dtype=self.manipulator.array.dtype)
+        self.manipulator.reshape((3, 12), out=reshaped)
+        np.testing.assert_array_equal(reshaped, self.manipulator.array.reshape(3, 12))
+
+    def test_lazy_mode(self):
+        lazy = ArrayAdvanced(lazy=True)
+        np.testing.assert_array_equal(lazy.transpose().compute(), lazy.array.T)
+        np.testing.assert_array_equal(lazy.reshape((3, 12)).compute(), lazy.array.reshape(3, 12))
+        combined = lazy.combine(lazy.split(3))
+        np.testing.assert_array_equal(combined.compute(), lazy.array)
+        with self.assertRaises(ValueError):
+            lazy.transpose(out=np.empty((6, 6)))
+
+    def test_blocked_transpose_on_memmap(self):
+        with tempfile.TemporaryDirectory() as path:
+            source = np.lib.format.open_memmap(os.path.join(path, 'source.npy'), mode='w+', dtype=np.int64,
+                                               shape=(37, 53))
+            source[:] = np.arange(37 * 53).reshape(37, 53)
+            for workers in [None, 3]:
+                out = ArrayAdvanced.blocked_transpose(source, os.path.join(path, f'out{workers}.npy'), tile=8,
+                                                      workers=workers)
+                self.assertIsInstance(out, np.memmap)
+                np.testing.assert_array_equal(out, source.T)
+                np.testing.assert_array_equal(np.load(os.path.join(path, f'out{workers}.npy')), source.T)
+                del out
+            del source
+
+    def test_blocked_reshape(self):
+        source = np.arange(37 * 53).reshape(37, 53).T
+        for workers in [None, 2]:
+            out = ArrayAdvanced.blocked_reshape(source, (-1, 37), np.empty((53, 37), dtype=source.dtype),
+                                                block_bytes=64, workers=workers)
+            np.testing.assert_array_equal(out, source.reshape(-1, 37))
+        with self.assertRaises(ValueError):
+            ArrayAdvanced.blocked_reshape(source, (10, 10), np.empty((10, 10)))
+
+    def test_out_uses_blocked_paths(self):
+        out = np.empty((12, 3), dtype=self.manipulator.array.dtype)
+        self.manipulator.reshape((12, 3), out=out)
+        np.testing.assert_array_equal(out, self.manipulator.array.reshape(12, 3))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 import numpy as np
 import os
-from tasks.array_data import DataHandler
+from tasks.array_data import DataHandler, RunningStats
 
 
 class TestDataHandler(unittest.TestCase):
@@ -11,6 +11,7 @@ class TestDataHandler(unittest.TestCase):
 
     def test_initial_array(self):
         self.assertEqual(self.analyzer.array.shape, (10, 10))
+        np.testing.assert_array_equal(self.analyzer.array, np.random.randint(1, 100, (10, 10)))
 
     def test_save_and_load_array(self):
         filename_base = "test_array"
@@ -27,6 +28,46 @@ class TestDataHandler(unittest.TestCase):
         for ext in ['txt', 'csv', 'npy']:
             os.remove(f"{filename_base}.{ext}")
 
+    def test_block_format(self):
+        filename = "test_blocks.blk"
+        self.analyzer.save_array("test_blocks", formats=['blk'], rows_per_block=3, workers=2)
+        try:
+            self.assertFalse(os.path.exists("test_blocks.npy"))
+            np.testing.assert_array_equal(self.analyzer.load_array(filename, 'blk'), self.analyzer.array)
+            np.testing.assert_array_equal(self.analyzer.load_array(filename, 'blk', rows=(2, 8), workers=2),
+                                          self.analyzer.array[2:8])
+            np.testing.assert_array_equal(self.analyzer.load_array(filename, 'blk', rows=(9, 20)),
+                                          self.analyzer.array[9:])
+            self.assertEqual(self.analyzer.load_array(filename, 'blk', rows=(5, 5)).shape, (0, 10))
+
+            with open(filename, 'r+b') as file:
+                file.seek(10)
+                byte = file.read(1)
+                file.seek(10)
+                file.write(bytes([byte[0] ^ 0xFF]))
+            with self.assertRaises(ValueError):
+                self.analyzer.load_array(filename, 'blk', rows=(0, 3))
+            np.testing.assert_array_equal(self.analyzer.load_array(filename, 'blk', rows=(3, 10)),
+                                          self.analyzer.array[3:])
+        finally:
+            os.remove(filename)
+        with self.assertRaises(ValueError):
+            self.analyzer.save_array("test_blocks", formats=['parquet'])
+
+    def test_iter_chunks(self):
+        filename_base = "test_chunks"
+        self.analyzer.save_array(filename_base)
+        try:
+            for ext in ['txt', 'csv', 'npy']:
+                chunks = list(self.analyzer.iter_chunks(f"{filename_base}.{ext}", ext, rows_per_chunk=3))
+                self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 3, 1])
+                np.testing.assert_array_equal(np.concatenate(chunks), self.analyzer.array)
+            with self.assertRaises(ValueError):
+                list(self.analyzer.iter_chunks(f"{filename_base}.npy", 'xlsx'))
+        finally:
+            for ext in ['txt', 'csv', 'npy']:
+                os.remove(f"{filename_base}.{ext}")
+
     def test_sum_array(self):
         self.assertEqual(self.analyzer.sum_array(), np.sum(self.analyzer.array))
 
@@ -52,6 +93,47 @@ class TestDataHandler(unittest.TestCase):
         self.assertEqual(col_aggregates['median'].shape, (10,))
         self.assertEqual(col_aggregates['std'].shape, (10,))
 
+        for axis in [(0, 1), (1, 0), -1, (-2, -1), None]:
+            aggregates = self.analyzer.axis_aggregates(axis)
+            np.testing.assert_array_almost_equal(aggregates['sum'], np.sum(self.analyzer.array, axis=axis))
+            np.testing.assert_array_almost_equal(aggregates['mean'], np.mean(self.analyzer.array, axis=axis))
+            np.testing.assert_array_almost_equal(aggregates['std'], np.std(self.analyzer.array, axis=axis))
+
+    def test_stream_aggregates(self):
+        filename_base = "test_stream"
+        self.analyzer.save_array(filename_base)
+        try:
+            for axis in [None, 0, 1]:
+                streamed = self.analyzer.stream_aggregates(f"{filename_base}.csv", 'csv', axis=axis, rows_per_chunk=3)
+                expected = self.analyzer.axis_aggregates(axis)
+                np.testing.assert_array_almost_equal(streamed['sum'], expected['sum'])
+                np.testing.assert_array_almost_equal(streamed['mean'], expected['mean'])
+                np.testing.assert_array_almost_equal(streamed['std'], expected['std'])
+                np.testing.assert_array_equal(streamed['min'], np.min(self.analyzer.array, axis=axis))
+                np.testing.assert_array_equal(streamed['max'], np.max(self.analyzer.array, axis=axis))
+                if axis == 1:
+                    np.testing.assert_array_equal(streamed['median'], expected['median'])
+                else:
+                    lower_median = np.quantile(self.analyzer.array, 0.5, axis=axis, method='lower')
+                    np.testing.assert_array_less(np.abs(streamed['median'] - lower_median), 0.0101 * lower_median)
+        finally:
+            for ext in ['txt', 'csv', 'npy']:
+                os.remove(f"{filename_base}.{ext}")
+
+    def test_running_stats_merge(self):
+        first, second, whole = RunningStats(axis=0), RunningStats(axis=0), RunningStats(axis=0)
+        first.update(self.analyzer.array[:4])
+        second.update(self.analyzer.array[4:])
+        whole.update(self.analyzer.array)
+        first.merge(second)
+        merged, expected = first.result(), whole.result()
+        self.assertEqual(merged['count'], 10)
+        for key in ['sum', 'mean', 'std', 'min', 'max', 'median']:
+            np.testing.assert_array_almost_equal(merged[key], expected[key])
+        np.testing.assert_array_almost_equal(merged['std'], np.std(self.analyzer.array, axis=0))
+        with self.assertRaises(ValueError):
+            RunningStats(axis=1)
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -29,6 +29,13 @@ class TestArrayManipulator(unittest.TestCase):
         expected = np.arange(2, 19, 2).reshape(3, 3)
         np.testing.assert_array_equal(self.manipulator.multiply_two_dim_by_two(), expected)
 
+    def test_lazy_mode(self):
+        lazy = BasicArrayManipulator(lazy=True)
+        np.testing.assert_array_equal(lazy.add_five_to_one_dim().compute(), np.arange(6, 16))
+        np.testing.assert_array_equal((lazy.multiply_two_dim_by_two() + 1).compute(),
+                                      np.arange(2, 19, 2).reshape(3, 3) + 1)
+        np.testing.assert_array_equal(lazy.two_dim_array, np.arange(1, 10).reshape(3, 3))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from benchmarks import compare, run, unbenchmarked
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_every_public_method_is_benchmarked(self):
+        self.assertEqual(unbenchmarked(), [])
+
+    def test_run_and_compare(self):
+        results = run(sizes=(1000,), repeat=1, match='ECommerceTransactions.total_revenue')
+        names = [result['benchmark'] for result in results['results']]
+        self.assertIn('ECommerceTransactions.total_revenue', names)
+        self.assertTrue(all(name.startswith('ECommerceTransactions.total_revenue') for name in names))
+        for result in results['results']:
+            self.assertEqual(result['size'], 1000)
+            self.assertGreater(result['seconds'], 0)
+            self.assertGreaterEqual(result['peak_bytes'], 0)
+
+        self.assertEqual(compare(results, results, threshold=0), [])
+        faster = dict(results, results=[dict(result, seconds=result['seconds'] / 2) for result in results['results']])
+        regressions = compare(results, faster, threshold=0.5)
+        self.assertEqual({regression['metric'] for regression in regressions}, {'seconds'})
+        self.assertEqual(len(regressions), len(names))
+        with self.assertRaises(ValueError):
+            compare(results, results, threshold=-1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,12 @@
+import os
+import tempfile
+import time
 import unittest
+from unittest import mock
 import numpy as np
 from datetime import datetime
-from tasks.ecommerce_transactions import ECommerceTransactions
+from fractions import Fraction
+from tasks.ecommerce_transactions import ECommerceTransactions, Selection
 
 
 class TestECommerceTransactions(unittest.TestCase):
@@ -27,10 +32,250 @@ class TestECommerceTransactions(unittest.TestCase):
         self.assertGreaterEqual(product, 1)
         self.assertLess(product, 501)
 
+    def test_approximate_counts(self):
+        self.assertAlmostEqual(self.analyzer.unique_users(approximate=True), self.analyzer.unique_users(), delta=3)
+        self.assertEqual(self.analyzer.most_purchased_product(approximate=True), self.analyzer.most_purchased_product())
+
+        large = ECommerceTransactions.generate(200000, seed=5, n_users=100000, n_products=50000)
+        estimate = large.unique_users(approximate=True)
+        sketch = large.sketch_users()
+        self.assertLessEqual(abs(estimate - large.unique_users()), 3 * sketch.standard_error * large.unique_users())
+
+        first, second = large.where(quantity__le=5).selection(), large.where(quantity__gt=5).selection()
+        merged = large.sketch_users(selection=first)
+        merged.merge(large.sketch_users(selection=second))
+        self.assertEqual(merged.count(), estimate)
+
+        products = large.sketch_products(capacity=100)
+        ids, counts = products.top(3)
+        true_counts = np.bincount(large.column('product_id'), weights=large.column('quantity'))[ids]
+        self.assertTrue(np.all(counts <= true_counts))
+        self.assertTrue(np.all(true_counts <= counts + products.error_bound()))
+        self.assertLessEqual(products.error_bound(), large.column('quantity').sum() / 101)
+
+    def test_cached_user_transaction_count_is_writable(self):
+        expected = self.analyzer.user_transaction_count()
+        counts = self.analyzer.user_transaction_count()
+        counts[1] += 1
+        np.testing.assert_array_equal(self.analyzer.user_transaction_count(), expected)
+
+    def test_aggregate_cache(self):
+        revenue = self.analyzer.total_revenue()
+        product = self.analyzer.most_purchased_product()
+        info = self.analyzer.cache_info()
+        self.assertEqual(self.analyzer.most_purchased_product(), product)
+        self.assertEqual(self.analyzer.cache_info()['hits'], info['hits'] + 1)
+        self.assertEqual(self.analyzer.cache_info()['misses'], info['misses'])
+
+        self.analyzer.increase_prices(10)
+        self.assertEqual(self.analyzer.cache_info()['version'], info['version'] + 1)
+        # Repriced prices are rounded to whole cents.
+        self.assertAlmostEqual(self.analyzer.total_revenue(), revenue * 1.1,
+                               delta=0.005 * self.analyzer.column('quantity').sum())
+        self.analyzer.most_purchased_product()
+        self.assertGreater(self.analyzer.cache_info()['misses'], info['misses'])
+
+    def test_append_updates_aggregates(self):
+        self.analyzer.total_revenue()
+        batch = ECommerceTransactions.generate(3000, seed=1, n_users=150, n_products=600)
+        batch_columns = {name: batch.column(name) for name in batch.check_data_types().names if name != 'transaction_id'}
+        self.analyzer.append(batch_columns)
+        self.analyzer.append(batch.transactions[:10])
+
+        self.assertEqual(len(self.analyzer), 4010)
+        np.testing.assert_array_equal(self.analyzer.column('transaction_id')[1000:4000], np.arange(1001, 4001))
+        rebuilt = ECommerceTransactions({name: self.analyzer.column(name)
+                                         for name in self.analyzer.check_data_types().names})
+        self.assertAlmostEqual(self.analyzer.total_revenue(), np.sum(rebuilt.column('quantity') * rebuilt.column('price')),
+                               places=2)
+        self.assertEqual(self.analyzer.unique_users(), np.unique(rebuilt.column('user_id')).size)
+        np.testing.assert_array_equal(self.analyzer.user_transaction_count(), np.bincount(rebuilt.column('user_id')))
+        self.assertEqual(self.analyzer.most_purchased_product(),
+                         np.argmax(np.bincount(rebuilt.column('product_id'), weights=rebuilt.column('quantity'))))
+        np.testing.assert_array_equal(self.analyzer.top_products(), rebuilt.top_products())
+
+    def test_append_rejects_malformed_batches(self):
+        with self.assertRaises(ValueError):
+            self.analyzer.append({'user_id': [1], 'product_id': [1], 'quantity': [1], 'price': [1.0]})
+        with self.assertRaises(ValueError):
+            self.analyzer.append(np.zeros((2, 5)))
+        self.assertEqual(len(self.analyzer), 1000)
+
+    def test_parallel_aggregates_match_serial(self):
+        mid_year = int(datetime(2024, 7, 1).timestamp())
+        end_year = int(datetime(2025, 1, 1).timestamp())
+        self.assertAlmostEqual(self.analyzer.total_revenue(workers=2), self.analyzer.total_revenue(), places=4)
+        np.testing.assert_array_equal(self.analyzer.user_transaction_count(workers=2),
+                                      self.analyzer.user_transaction_count())
+        self.assertEqual(self.analyzer.most_purchased_product(workers=2), self.analyzer.most_purchased_product())
+        np.testing.assert_array_equal(self.analyzer.top_products(workers=2), self.analyzer.top_products())
+        np.testing.assert_array_almost_equal(self.analyzer.revenue_comparison(mid_year, end_year, workers=2),
+                                             self.analyzer.revenue_comparison(mid_year, end_year), decimal=4)
+
+    def test_save_and_open_memory_mapped(self):
+        with tempfile.TemporaryDirectory() as path:
+            self.analyzer.save(path)
+            self.assertTrue(os.path.exists(os.path.join(path, 'manifest.json')))
+            mapped = ECommerceTransactions.open(path)
+            self.assertIsInstance(mapped.column('timestamp'), np.memmap)
+            self.assertEqual(mapped.check_data_types(), self.analyzer.check_data_types())
+            np.testing.assert_array_equal(mapped.transactions, self.analyzer.transactions)
+            self.assertAlmostEqual(mapped.total_revenue(), self.analyzer.total_revenue(), places=4)
+            np.testing.assert_array_equal(mapped.user_transaction_count(), self.analyzer.user_transaction_count())
+            np.testing.assert_array_equal(mapped.top_products(), self.analyzer.top_products())
+            with self.assertRaises(ValueError):
+                mapped.increase_prices(5)
+
+            copy_on_write = ECommerceTransactions.open(path, mmap_mode='c')
+            copy_on_write.increase_prices(10)
+            self.assertAlmostEqual(copy_on_write.total_revenue(), self.analyzer.total_revenue() * 1.1,
+                                   delta=0.005 * self.analyzer.column('quantity').sum())
+            del mapped, copy_on_write
+
     def test_check_data_types(self):
         dtype = self.analyzer.check_data_types()
         self.assertIsInstance(dtype, np.dtype)
 
+    def test_typed_columns(self):
+        dtype = self.analyzer.check_data_types()
+        self.assertEqual(dtype.names, ('transaction_id', 'user_id', 'product_id', 'quantity', 'price', 'timestamp'))
+        self.assertEqual(self.analyzer.column('user_id').dtype, np.uint8)
+        self.assertEqual(self.analyzer.column('product_id').dtype, np.uint16)
+        self.assertEqual(self.analyzer.column('quantity').dtype, np.uint8)
+        self.assertEqual(self.analyzer.column('price').dtype, np.float64)
+
+    def test_append_widens_narrowed_columns(self):
+        self.analyzer.append({'user_id': [300], 'product_id': [70000], 'quantity': [2], 'price': [5.0],
+                              'timestamp': [1704067200]})
+        self.assertEqual(self.analyzer.column('user_id').dtype, np.uint16)
+        self.assertEqual(self.analyzer.column('product_id').dtype, np.uint32)
+        self.assertEqual(self.analyzer.user_transaction_count()[300], 1)
+        self.assertEqual(len(self.analyzer.product_transactions(70000)), 1)
+
+    def test_sparse_ids_are_dictionary_encoded(self):
+        dense = ECommerceTransactions.generate(2000, seed=3, n_users=50, n_products=40)
+        sparse_ids = {name: 10 ** 15 + 7919 * dense.column(name).astype(np.int64) for name in ('user_id', 'product_id')}
+        sparse = ECommerceTransactions(dict({name: dense.column(name) for name in dense.check_data_types().names},
+                                            **sparse_ids))
+        self.assertIsNotNone(sparse.id_dictionary('user_id'))
+        self.assertEqual(sparse.check_data_types()['user_id'], np.uint8)
+        np.testing.assert_array_equal(sparse.column('product_id'), sparse_ids['product_id'])
+        self.assertEqual(sparse.unique_users(), dense.unique_users())
+        self.assertEqual(sparse.most_purchased_product(), 10 ** 15 + 7919 * dense.most_purchased_product())
+        np.testing.assert_array_equal(sparse.top_products()[:, 0], dense.top_products()[:, 0])
+        np.testing.assert_array_equal(sparse.user_transactions(10 ** 15 + 7919 * 3)[:, 0],
+                                      dense.user_transactions(3)[:, 0])
+        self.assertEqual(len(sparse.user_transactions(3)), 0)
+
+        user_ids, counts = sparse.user_transaction_count(return_ids=True)
+        dense_ids, dense_counts = dense.user_transaction_count(return_ids=True)
+        np.testing.assert_array_equal(user_ids, 10 ** 15 + 7919 * dense_ids)
+        np.testing.assert_array_equal(counts, dense_counts)
+        with self.assertRaises(ValueError):
+            sparse.user_transaction_count()
+
+        sparse.append({'user_id': [-5], 'product_id': [10 ** 15 + 7919], 'quantity': [1], 'price': [1.0],
+                       'timestamp': [1704067200]})
+        self.assertEqual(sparse.unique_users(), dense.unique_users() + 1)
+        self.assertEqual(sparse.user_transactions(-5)[0, 2], 10 ** 15 + 7919)
+        with tempfile.TemporaryDirectory() as path:
+            sparse.save(path)
+            mapped = ECommerceTransactions.open(path)
+            np.testing.assert_array_equal(mapped.transactions, sparse.transactions)
+            np.testing.assert_array_equal(mapped.top_products(), sparse.top_products())
+            del mapped
+
+    def test_append_encodes_ids_that_become_sparse(self):
+        self.analyzer.total_revenue()
+        self.analyzer.append({'user_id': [2 ** 40], 'product_id': [1], 'quantity': [1], 'price': [1.0],
+                              'timestamp': [1704067200]})
+        self.assertIsNotNone(self.analyzer.id_dictionary('user_id'))
+        self.assertEqual(self.analyzer.unique_users(), 101)
+        np.testing.assert_array_equal(self.analyzer.column('user_id')[-1:], [2 ** 40])
+        self.assertEqual(len(self.analyzer.user_transactions(1)), np.sum(self.analyzer.column('user_id') == 1))
+
+    def test_transactions_view_matches_columns(self):
+        transactions = self.analyzer.transactions
+        self.assertEqual(transactions.dtype, object)
+        np.testing.assert_array_equal(transactions[:, 1].astype(int), self.analyzer.column('user_id'))
+        np.testing.assert_array_equal(transactions[:, 4].astype(float), self.analyzer.column('price'))
+
+    def test_transactions_view_is_only_built_on_access(self):
+        batch = np.array([[1001, 1, 1, 2, 9.99, 1704067200]])
+        # Every path to the legacy layout, the transactions property included, goes through _rows.
+        rows = mock.Mock(side_effect=AssertionError('object rows built'))
+        view = mock.PropertyMock(side_effect=AssertionError('object view built'))
+        with mock.patch.object(ECommerceTransactions, '_rows', rows), \
+                mock.patch.object(ECommerceTransactions, 'transactions', view):
+            self.analyzer.append(batch)
+            self.analyzer.increase_prices(5)
+            self.analyzer.convert_price_to_int()
+            self.analyzer.total_revenue()
+            self.analyzer.unique_users()
+            self.analyzer.user_transaction_count()
+            self.analyzer.revenue_by_period('day')
+            self.analyzer.track_top_products(3)
+            top = self.analyzer.top_products(3)
+            filtered = self.analyzer.filter_transactions()
+            selections = [top, filtered, self.analyzer.user_transactions(1), self.analyzer.product_transactions(1),
+                          self.analyzer.date_range_transactions('2024-01-01', '2024-06-30')]
+            combined = (top | filtered) & ~selections[2]
+            self.assertEqual(len(combined), len(combined.positions()))
+            combined.columns('price')
+            self.analyzer.total_revenue(selection=combined)
+            query = self.analyzer.where(quantity__gt=2, user_id__in=[1, 2, 3])
+            query.columns()
+            query.selection()
+            query.agg(revenue=('revenue', 'sum'), buyers=('user_id', 'nunique'))
+        rows.assert_not_called()
+        view.assert_not_called()
+
+    def test_generate(self):
+        generated = ECommerceTransactions.generate(5000, seed=7, n_users=20, n_products=30)
+        self.assertEqual(len(generated), 5000)
+        np.testing.assert_array_equal(generated.column('transaction_id'), np.arange(1, 5001))
+        self.assertTrue(np.all((generated.column('user_id') >= 1) & (generated.column('user_id') <= 20)))
+        self.assertTrue(np.all((generated.column('product_id') >= 1) & (generated.column('product_id') <= 30)))
+        self.assertTrue(np.all((generated.column('quantity') >= 1) & (generated.column('quantity') <= 10)))
+        start_timestamp = int(datetime(2024, 1, 1).timestamp())
+        end_timestamp = int(datetime(2024, 12, 31).timestamp())
+        timestamps = generated.column('timestamp')
+        self.assertTrue(np.all((timestamps >= start_timestamp) & (timestamps < end_timestamp)))
+
+    def test_default_dataset_is_built_lazily(self):
+        np.random.seed(0)
+        state = np.random.get_state()[1].copy()
+        lazy = ECommerceTransactions()
+        self.assertNotIn('_columns', vars(lazy))
+        self.assertEqual(len(lazy), 1000)
+        np.testing.assert_array_equal(lazy.transactions, self.analyzer.transactions)
+        np.testing.assert_array_equal(np.random.get_state()[1], state)
+        with self.assertRaises(AttributeError):
+            lazy.missing_attribute
+
+    def test_generate_snapshot_cache(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            first = ECommerceTransactions.generate(5000, seed=7, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            second = ECommerceTransactions.generate(5000, seed=7, start=datetime(2024, 1, 1), cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertIsInstance(second.column('timestamp'), np.memmap)
+            np.testing.assert_array_equal(second.transactions, ECommerceTransactions.generate(5000, seed=7).transactions)
+            second.increase_prices(10)
+            np.testing.assert_array_equal(ECommerceTransactions.generate(5000, seed=7, cache_dir=cache_dir).transactions,
+                                          first.transactions)
+            ECommerceTransactions.generate(5000, seed=8, cache_dir=cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            del first, second
+
+    def test_generate_is_chunk_size_independent(self):
+        whole = ECommerceTransactions.generate(150000, seed=3)
+        chunked = ECommerceTransactions.generate(150000, seed=3, chunk_size=1)
+        for name in whole.check_data_types().names:
+            np.testing.assert_array_equal(whole.column(name), chunked.column(name))
+        other_seed = ECommerceTransactions.generate(150000, seed=4)
+        self.assertFalse(np.array_equal(whole.column('price'), other_seed.column('price')))
+
     def test_product_quantity_array(self):
         pq_array = self.analyzer.product_quantity_array()
         self.assertEqual(pq_array.shape, (1000, 2))
@@ -49,12 +294,133 @@ class TestECommerceTransactions(unittest.TestCase):
     def test_increase_prices(self):
         original_prices = self.analyzer.transactions[:, 4].copy()
         increased = self.analyzer.increase_prices(10)
-        np.testing.assert_array_almost_equal(increased[:, 4], original_prices * 1.1)
+        np.testing.assert_array_almost_equal(increased[:, 4], original_prices * 1.1, decimal=2)
+        # Exact cents, rounded half to even.
+        cents = [round(Fraction(round(price * 100) * 11, 10)) for price in original_prices]
+        np.testing.assert_array_equal(np.rint(self.analyzer.column('price') * 100), cents)
+
+    def test_increase_prices_per_product_is_exact(self):
+        analyzer = ECommerceTransactions({'user_id': [1, 2, 3, 4], 'product_id': [1, 2, 2, 3],
+                                          'quantity': [1, 1, 2, 1], 'price': [0.05, 0.15, 0.25, 19.99],
+                                          'timestamp': [0, 1, 2, 3], 'transaction_id': [1, 2, 3, 4]})
+        analyzer.increase_prices([0, 10, -50, 0])
+        np.testing.assert_array_equal(analyzer.column('price'), [0.06, 0.08, 0.12, 19.99])
+        self.assertEqual(analyzer.total_revenue(), 20.37)
+        with self.assertRaises(ValueError):
+            analyzer.increase_prices([5, 5])
+
+        repriced = ECommerceTransactions()
+        for _ in range(10):
+            repriced.increase_prices(7.5)
+        for _ in range(10):
+            self.analyzer.increase_prices(7.5)
+        np.testing.assert_array_equal(repriced.column('price'), self.analyzer.column('price'))
+        self.assertEqual(self.analyzer.where(price=19.99).agg(n=('price', 'count'))['n'],
+                         np.count_nonzero(np.rint(self.analyzer.column('price') * 100) == 1999))
+
+    def test_revenue_overflow_raises(self):
+        analyzer = ECommerceTransactions({'user_id': [1, 2], 'product_id': [1, 2], 'quantity': [10, 10],
+                                          'price': [1e16, 1e16], 'timestamp': [0, 1],
+                                          'transaction_id': [1, 2]})
+        with self.assertRaises(OverflowError):
+            analyzer.total_revenue()
+        with self.assertRaises(OverflowError):
+            analyzer.increase_prices(10 ** 6)
 
     def test_filter_transactions(self):
         filtered = self.analyzer.filter_transactions()
         self.assertTrue(np.all(filtered[:, 3] > 1))
 
+    def test_where_matches_masks(self):
+        columns = {name: self.analyzer.column(name) for name in self.analyzer.check_data_types().names}
+        start, end = int(datetime(2024, 3, 1).timestamp()), int(datetime(2024, 6, 1).timestamp())
+        mask = ((columns['quantity'] > 2) & np.isin(columns['user_id'], [3, 5, 8, 13])
+                & (columns['timestamp'] >= start) & (columns['timestamp'] < end))
+        query = self.analyzer.where(quantity__gt=2, user_id__in=[3, 5, 8, 13], ts__between=('2024-03-01', '2024-06-01'))
+        np.testing.assert_array_equal(query.positions(), np.flatnonzero(mask))
+        np.testing.assert_array_equal(query.rows(), self.analyzer.transactions[mask])
+
+        self.analyzer.build_time_index()
+        self.analyzer.user_transactions(3)  # builds the user_id group index
+        np.testing.assert_array_equal(query.positions(), np.flatnonzero(mask))
+        np.testing.assert_array_equal(self.analyzer.where(ts__ge=start, ts__lt=end, user_id=3).positions(),
+                                      np.flatnonzero((columns['timestamp'] >= start) & (columns['timestamp'] < end)
+                                                     & (columns['user_id'] == 3)))
+        self.assertEqual(len(self.analyzer.where(quantity__gt=10, user_id__ne=1)), 0)
+
+    def test_where_select_and_agg(self):
+        query = self.analyzer.where(quantity__le=3).select('product_id', 'ts')
+        quantity = self.analyzer.column('quantity')
+        selected = query.columns()
+        self.assertEqual(list(selected), ['product_id', 'timestamp'])
+        np.testing.assert_array_equal(selected['product_id'], self.analyzer.column('product_id')[quantity <= 3])
+        self.assertEqual(query.rows().shape, (np.sum(quantity <= 3), 2))
+
+        result = query.agg(units=('quantity', 'sum'), revenue=('revenue', 'sum'),
+                           buyers=('user_id', 'nunique'), rows=('ts', 'count'))
+        self.assertEqual(result['units'], quantity[quantity <= 3].sum())
+        self.assertAlmostEqual(result['revenue'], np.sum((quantity * self.analyzer.column('price'))[quantity <= 3]))
+        self.assertEqual(result['buyers'], len(np.unique(self.analyzer.column('user_id')[quantity <= 3])))
+        self.assertEqual(result['rows'], np.sum(quantity <= 3))
+        self.assertTrue(np.isnan(self.analyzer.where(quantity=0).agg(low=('price', 'min'))['low']))
+        with self.assertRaises(ValueError):
+            self.analyzer.where(colour='red')
+        with self.assertRaises(ValueError):
+            self.analyzer.where(quantity__near=3)
+        with self.assertRaises(ValueError):
+            query.agg(spread=('price', 'std'))
+
+    def test_selection_bitmaps(self):
+        quantity = self.analyzer.column('quantity')
+        user_ids = self.analyzer.column('user_id')
+        large = self.analyzer.filter_transactions()
+        regular = self.analyzer.user_transactions(7)
+        self.assertEqual(large._bits.nbytes, 125)
+        self.assertEqual(len(large), np.sum(quantity > 1))
+        np.testing.assert_array_equal(large.mask(), quantity > 1)
+        np.testing.assert_array_equal((large & regular).positions(), np.flatnonzero((quantity > 1) & (user_ids == 7)))
+        np.testing.assert_array_equal((large | regular).mask(), (quantity > 1) | (user_ids == 7))
+        np.testing.assert_array_equal((large ^ regular).mask(), (quantity > 1) ^ (user_ids == 7))
+        np.testing.assert_array_equal((~large).mask(), quantity <= 1)
+
+        sized = Selection.from_mask(self.analyzer, np.arange(999) % 3 == 0)
+        self.assertEqual(len(~sized), 666)
+        with self.assertRaises(ValueError):
+            large & ECommerceTransactions.generate(1000).filter_transactions()
+        np.testing.assert_array_equal(self.analyzer.where(quantity__gt=1).rows(), np.asarray(large))
+
+    def test_selection_indexes_like_rows(self):
+        rows = self.analyzer.transactions[self.analyzer.column('quantity') > 1]
+        selection = self.analyzer.filter_transactions()
+        self.assertEqual(selection.shape, rows.shape)
+        np.testing.assert_array_equal(selection[:, 3], rows[:, 3])
+        np.testing.assert_array_equal(selection[:5], rows[:5])
+        np.testing.assert_array_equal(selection[2], rows[2])
+        np.testing.assert_array_equal(selection[-1, [0, 4]], rows[-1, [0, 4]])
+        self.assertEqual(selection[3, 1], rows[3, 1])
+        columns = selection.columns('price', 'ts')
+        self.assertEqual(list(columns), ['price', 'timestamp'])
+        np.testing.assert_array_equal(columns['price'], rows[:, 4].astype(float))
+
+    def test_aggregates_accept_selection(self):
+        selection = self.analyzer.where(quantity__ge=5).selection()
+        mask = self.analyzer.column('quantity') >= 5
+        subset = ECommerceTransactions({name: self.analyzer.column(name)[mask]
+                                        for name in self.analyzer.check_data_types().names})
+        self.assertAlmostEqual(self.analyzer.total_revenue(selection=selection), subset.total_revenue(), places=4)
+        self.assertEqual(self.analyzer.unique_users(selection=selection), subset.unique_users())
+        self.assertEqual(self.analyzer.most_purchased_product(selection=selection), subset.most_purchased_product())
+        counts = self.analyzer.user_transaction_count(selection=selection)
+        np.testing.assert_array_equal(counts[:len(subset.user_transaction_count())], subset.user_transaction_count())
+        np.testing.assert_array_equal(self.analyzer.top_products(selection=selection)[:, 0],
+                                      subset.top_products()[:, 0])
+        mid_year = int(datetime(2024, 7, 1).timestamp())
+        np.testing.assert_array_almost_equal(self.analyzer.revenue_comparison(mid_year, mid_year + 86400 * 30,
+                                                                              selection=selection),
+                                             subset.revenue_comparison(mid_year, mid_year + 86400 * 30))
+        np.testing.assert_array_almost_equal(self.analyzer.revenue_by_period('month', selection=selection)['revenue'],
+                                             subset.revenue_by_period('month')['revenue'])
+
     def test_revenue_comparison(self):
         mid_year = int(datetime(2023, 7, 1).timestamp())
         end_year = int(datetime(2024, 1, 1).timestamp())
@@ -62,10 +428,76 @@ class TestECommerceTransactions(unittest.TestCase):
         self.assertIsInstance(rev1, (int, float))
         self.assertIsInstance(rev2, (int, float))
 
+    def test_time_index_matches_scan(self):
+        first_half = int(datetime(2024, 7, 1).timestamp())
+        end_year = int(datetime(2025, 1, 1).timestamp())
+        expected_revenue = self.analyzer.revenue_comparison(first_half, end_year)
+        expected_rows = self.analyzer.date_range_transactions("2024-06-01", "2024-07-01")
+
+        self.analyzer.build_time_index()
+        rev1, rev2 = self.analyzer.revenue_comparison(first_half, end_year)
+        self.assertAlmostEqual(rev1, expected_revenue[0], places=4)
+        self.assertAlmostEqual(rev2, expected_revenue[1], places=4)
+        self.assertEqual(self.analyzer.revenue_comparison(end_year, first_half)[1], 0)
+        np.testing.assert_array_equal(self.analyzer.date_range_transactions("2024-06-01", "2024-07-01"),
+                                      expected_rows)
+
+    def test_time_index_invalidated_by_price_change(self):
+        self.analyzer.build_time_index()
+        end_year = int(datetime(2025, 1, 1).timestamp())
+        before, _ = self.analyzer.revenue_comparison(end_year, end_year)
+        self.analyzer.increase_prices(10)
+        after, _ = self.analyzer.revenue_comparison(end_year, end_year)
+        self.assertAlmostEqual(after, before * 1.1, delta=0.005 * self.analyzer.column('quantity').sum())
+
+    def test_revenue_in_windows(self):
+        boundaries = [int(datetime(2024, month, 1).timestamp()) for month in range(1, 13)]
+        expected = [self.analyzer.revenue_comparison(start, stop)[1] for start, stop in zip(boundaries, boundaries[1:])]
+        np.testing.assert_array_almost_equal(self.analyzer.revenue_in_windows(boundaries), expected, decimal=4)
+
+        by_user = self.analyzer.revenue_in_windows(boundaries, by='user_id')
+        self.assertEqual(by_user.shape, (11, 101))
+        np.testing.assert_array_almost_equal(by_user.sum(axis=1), expected, decimal=4)
+        user_ids, timestamps = self.analyzer.column('user_id'), self.analyzer.column('timestamp')
+        in_march = (user_ids == 7) & (timestamps >= boundaries[2]) & (timestamps < boundaries[3])
+        self.assertAlmostEqual(by_user[2, 7], np.sum(self.analyzer.column('quantity')[in_march] *
+                                                     self.analyzer.column('price')[in_march]), places=4)
+
+        self.analyzer.build_time_index()
+        np.testing.assert_array_almost_equal(self.analyzer.revenue_in_windows(boundaries), expected, decimal=4)
+        self.assertEqual(len(self.analyzer.revenue_in_windows(boundaries[:1])), 0)
+        with self.assertRaises(ValueError):
+            self.analyzer.revenue_in_windows(boundaries[::-1])
+
     def test_user_transactions(self):
         user_trans = self.analyzer.user_transactions(1)
         self.assertTrue(np.all(user_trans[:, 1] == 1))
 
+    def test_user_transactions_keeps_row_order(self):
+        user_ids = self.analyzer.column('user_id')
+        np.testing.assert_array_equal(self.analyzer.user_transactions(7)[:, 0].astype(int),
+                                      self.analyzer.column('transaction_id')[user_ids == 7])
+        self.assertEqual(len(self.analyzer.user_transactions(1000)), 0)
+
+    def test_product_transactions(self):
+        product_trans = self.analyzer.product_transactions(42)
+        self.assertEqual(len(product_trans), np.sum(self.analyzer.column('product_id') == 42))
+        self.assertTrue(np.all(product_trans[:, 2] == 42))
+
+    def test_users_transactions(self):
+        rows, offsets = self.analyzer.users_transactions([5, 0, 3, 5, -1])
+        self.assertEqual(len(offsets), 6)
+        for i, user_id in enumerate([5, 0, 3, 5, -1]):
+            expected = self.analyzer.user_transactions(user_id) if user_id >= 0 else rows[:0]
+            np.testing.assert_array_equal(rows[offsets[i]:offsets[i + 1]], expected)
+
+    def test_group_index_invalidated_by_price_change(self):
+        self.analyzer.user_transactions(1)
+        self.analyzer.increase_prices(10)
+        user_ids = self.analyzer.column('user_id')
+        np.testing.assert_array_almost_equal(self.analyzer.user_transactions(1)[:, 4].astype(float),
+                                             self.analyzer.column('price')[user_ids == 1])
+
     def test_date_range_transactions(self):
         transactions = self.analyzer.date_range_transactions("2023-06-01", "2023-07-01")
         start_timestamp = int(datetime(2023, 6, 1).timestamp())
@@ -77,12 +509,161 @@ class TestECommerceTransactions(unittest.TestCase):
         unique_products = np.unique(top_prod_trans[:, 2])
         self.assertLessEqual(len(unique_products), 5)
 
+    def test_top_products_by_quantity(self):
+        product_ids = self.analyzer.column('product_id')
+        quantities = np.bincount(product_ids, weights=self.analyzer.column('quantity'))
+        top_prod_trans = self.analyzer.top_products(k=3, by='quantity')
+        top_ids = np.unique(top_prod_trans[:, 2].astype(int))
+        self.assertEqual(len(top_ids), 3)
+        self.assertGreaterEqual(quantities[top_ids].min(), np.sort(quantities)[-3])
+        np.testing.assert_array_equal(top_prod_trans[:, 0].astype(int),
+                                      self.analyzer.column('transaction_id')[np.isin(product_ids, top_ids)])
+        with self.assertRaises(ValueError):
+            self.analyzer.top_products(by='price')
+
+    def test_top_products_k_bounds(self):
+        self.assertEqual(len(self.analyzer.top_products(k=0)), 0)
+        self.assertEqual(len(self.analyzer.top_products(k=0, workers=2)), 0)
+        self.assertEqual(len(self.analyzer.top_products(k=0, selection=self.analyzer.filter_transactions())), 0)
+        self.analyzer.track_top_products(k=0)
+        self.assertEqual(len(self.analyzer.top_products(k=0)), 0)
+        with self.assertRaises(ValueError):
+            self.analyzer.top_products(k=-1)
+        with self.assertRaises(ValueError):
+            self.analyzer.track_top_products(k=-1)
+
+    def test_tracked_leaderboard_resets_on_lowered_quantity(self):
+        analyzer = ECommerceTransactions({'transaction_id': [1, 2, 3], 'user_id': [1, 1, 1], 'product_id': [1, 2, 3],
+                                          'quantity': [5, 4, 1], 'price': [1.0, 1.0, 1.0],
+                                          'timestamp': [1704067200] * 3})
+        analyzer.track_top_products(k=1, by='quantity')
+        self.assertEqual(analyzer.top_products(k=1, by='quantity')[:, 2].astype(int).tolist(), [1])
+        analyzer.append({'product_id': [1], 'user_id': [1], 'quantity': [-3], 'price': [0.0],
+                         'timestamp': [1704067200]})
+        self.assertEqual(analyzer.top_products(k=1, by='quantity')[:, 2].astype(int).tolist(), [2])
+
+    def test_tracked_leaderboard_follows_appends(self):
+        self.analyzer.track_top_products(k=4)
+        self.analyzer.top_products(k=4)
+        for seed in range(3):
+            batch = ECommerceTransactions.generate(500, seed=seed, n_products=520)
+            self.analyzer.append({name: batch.column(name)
+                                  for name in ('user_id', 'product_id', 'quantity', 'price', 'timestamp')})
+            product_revenue = np.bincount(self.analyzer.column('product_id'),
+                                          weights=self.analyzer.column('quantity') * self.analyzer.column('price'))
+            expected = np.sort(np.argsort(product_revenue)[-4:])
+            np.testing.assert_array_equal(np.unique(self.analyzer.top_products(k=4)[:, 2].astype(int)), expected)
+
+    def test_revenue_by_period(self):
+        timestamps = self.analyzer.column('timestamp')
+        revenue = self.analyzer.column('quantity') * self.analyzer.column('price')
+        for freq, unit in [('hour', 'h'), ('day', 'D'), ('month', 'M')]:
+            rollup = self.analyzer.revenue_by_period(freq, utc_offset=0)
+            self.assertAlmostEqual(rollup['revenue'].sum(), self.analyzer.total_revenue(), places=4)
+            self.assertEqual(rollup['transactions'].sum(), 1000)
+            self.assertEqual(rollup['quantity'].sum(), self.analyzer.column('quantity').sum())
+            periods = timestamps.astype('datetime64[s]').astype(f'datetime64[{unit}]')
+            first = periods == periods.min()
+            self.assertEqual(rollup['period'][0], periods.min())
+            self.assertAlmostEqual(rollup['revenue'][0], revenue[first].sum(), places=4)
+            self.assertEqual(rollup['transactions'][0], np.count_nonzero(first))
+
+        weeks = self.analyzer.revenue_by_period('week')['period'].astype(np.int64)
+        self.assertTrue(np.all((weeks + 3) % 7 == 0))
+        self.assertEqual(len(self.analyzer.revenue_by_period('month')['period']), 12)
+        with self.assertRaises(ValueError):
+            self.analyzer.revenue_by_period('year')
+
+    def test_revenue_by_period_uses_local_dates(self):
+        previous = os.environ.get('TZ')
+        os.environ['TZ'] = 'America/New_York'
+        time.tzset()
+        try:
+            # Timestamps at any second of 2024, across both daylight saving changes.
+            generated = ECommerceTransactions.generate(5000, seed=3)
+            dates = np.array(generated.get_readable_dates(), dtype='datetime64[D]')
+            for freq in ['day', 'hour']:
+                rollup = generated.revenue_by_period(freq)
+                self.assertEqual(rollup['period'][0].astype('datetime64[D]'), dates.min())
+                self.assertEqual(rollup['period'][-1].astype('datetime64[D]'), dates.max())
+            days, counts = np.unique(dates, return_counts=True)
+            rollup = generated.revenue_by_period('day')
+            np.testing.assert_array_equal(rollup['transactions'][np.isin(rollup['period'], days)], counts)
+            self.assertEqual(rollup['transactions'].sum(), 5000)
+        finally:
+            if previous is None:
+                del os.environ['TZ']
+            else:
+                os.environ['TZ'] = previous
+            time.tzset()
+
+    def test_dimension_joins(self):
+        # Products 1..400 are cataloged; the rest have no entry.
+        catalog_ids = np.arange(400, 0, -1)
+        categories = np.array(['books', 'games', 'music', 'toys'])[catalog_ids % 4]
+        costs = np.round(catalog_ids * 0.37, 2)
+        self.analyzer.attach_dimension('product_id', catalog_ids, category=categories, cost=costs)
+        # Sparse user keys are resolved by binary search rather than a dense table.
+        user_keys = np.append(np.arange(100, 0, -1), 10 ** 12)
+        self.analyzer.attach_dimension('user_id', user_keys, region=user_keys % 3)
+
+        product_ids = self.analyzer.column('product_id')
+        category_of = dict(zip(catalog_ids.tolist(), categories.tolist()))
+        cost_of = dict(zip(catalog_ids.tolist(), costs.tolist()))
+        expected_categories = [category_of.get(product_id, 'none') for product_id in product_ids.tolist()]
+        np.testing.assert_array_equal(self.analyzer.joined_column('category', default='none'), expected_categories)
+        with self.assertRaises(ValueError):
+            self.analyzer.joined_column('category')
+        np.testing.assert_array_equal(self.analyzer.joined_column('region'), self.analyzer.column('user_id') % 3)
+
+        rollup = self.analyzer.revenue_by('category', cost='cost')
+        np.testing.assert_array_equal(rollup['group'], ['books', 'games', 'music', 'toys'])
+        revenue = self.analyzer.column('quantity') * self.analyzer.column('price')
+        for group, category in enumerate(rollup['group']):
+            rows = np.array(expected_categories) == category
+            self.assertAlmostEqual(rollup['revenue'][group], revenue[rows].sum(), places=6)
+            self.assertEqual(rollup['transactions'][group], np.count_nonzero(rows))
+            cost = sum(quantity * cost_of[product_id] for quantity, product_id
+                       in zip(self.analyzer.column('quantity')[rows], product_ids[rows]))
+            self.assertAlmostEqual(rollup['cost'][group], cost, places=6)
+            self.assertAlmostEqual(rollup['margin'][group], revenue[rows].sum() - cost, places=6)
+
+        by_region = self.analyzer.revenue_by('region')
+        self.assertAlmostEqual(by_region['revenue'].sum(), self.analyzer.total_revenue(), places=6)
+        selection = self.analyzer.where(quantity__gt=5).selection()
+        self.assertEqual(self.analyzer.revenue_by('region', selection=selection)['transactions'].sum(), len(selection))
+        with self.assertRaises(ValueError):
+            self.analyzer.revenue_by('region', cost='region')
+        with self.assertRaises(ValueError):
+            self.analyzer.attach_dimension('user_id', [1, 1], region=[0, 1])
+        with self.assertRaises(ValueError):
+            self.analyzer.attach_dimension('user_id', [1], category=['books'])
+
+    def test_attach_dimension_keeps_unrelated_state(self):
+        self.analyzer.build_time_index()
+        product = self.analyzer.most_purchased_product()
+        self.analyzer.attach_dimension('user_id', np.arange(1, 101), region=np.arange(1, 101) % 2)
+        self.assertEqual(self.analyzer.revenue_by('region')['group'].tolist(), [0, 1])
+        info = self.analyzer.cache_info()
+        time_index = self.analyzer._indexes['timestamp']
+
+        self.analyzer.attach_dimension('user_id', np.arange(1, 101), region=np.arange(1, 101) % 3)
+        self.assertEqual(self.analyzer.cache_info()['version'], info['version'])
+        self.assertIs(self.analyzer._indexes['timestamp'], time_index)
+        self.assertEqual(self.analyzer.most_purchased_product(), product)
+        self.assertEqual(self.analyzer.cache_info()['hits'], info['hits'] + 1)
+        by_region = self.analyzer.revenue_by('region')
+        self.assertEqual(by_region['group'].tolist(), [0, 1, 2])
+        self.assertAlmostEqual(by_region['revenue'].sum(), self.analyzer.total_revenue(), places=6)
+
     def test_get_readable_dates(self):
         dates = self.analyzer.get_readable_dates()
         self.assertEqual(len(dates), 1000)
         for date in dates:
             self.assertTrue(date.startswith('2024-'))
             datetime.strptime(date, '%Y-%m-%d')
+        expected = [datetime.fromtimestamp(ts).strftime('%Y-%m-%d') for ts in self.analyzer.column('timestamp').tolist()]
+        self.assertEqual(dates, expected)
 
 
 if __name__ == '__main__':
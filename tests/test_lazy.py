@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+from tasks.lazy import LazyArray, concatenate
+
+
+class TestLazyArray(unittest.TestCase):
+    def setUp(self):
+        self.array = np.arange(24).reshape(4, 6)
+        self.source = LazyArray.source(self.array)
+
+    def test_layout_chain_matches_eager(self):
+        expr = self.source.reshape((6, 4)).reshape((2, 12)).transpose().transpose((1, 0)).transpose()
+        expected = self.array.reshape(6, 4).reshape(2, 12).T.transpose(1, 0).T
+        np.testing.assert_array_equal(expr.compute(), expected)
+        self.assertTrue(np.shares_memory(expr.compute(), self.array))
+
+    def test_elementwise_chain_fuses_into_one_buffer(self):
+        result = ((self.source.transpose() + 5) * 2 - 1).compute()
+        np.testing.assert_array_equal(result, (self.array.T + 5) * 2 - 1)
+        self.assertFalse(np.shares_memory(result, self.array))
+        np.testing.assert_array_equal((self.source * 2.5).compute(), self.array * 2.5)
+        np.testing.assert_array_equal(self.array, np.arange(24).reshape(4, 6))
+
+    def test_split_combine_round_trip_is_skipped(self):
+        pieces = self.source.reshape((6, 4)).split(3, axis=0)
+        combined = concatenate(pieces).compute()
+        np.testing.assert_array_equal(combined, self.array.reshape(6, 4))
+        self.assertTrue(np.shares_memory(combined, self.array))
+
+        reordered = concatenate(pieces[::-1]).compute()
+        np.testing.assert_array_equal(reordered, np.concatenate(np.split(self.array.reshape(6, 4), 3)[::-1]))
+
+    def test_concatenate_of_mixed_splits_is_evaluated(self):
+        square = LazyArray.source(np.arange(36).reshape(6, 6))
+        mixed = concatenate([square.split(3)[0], square.split(2)[1], square.split(3)[2]]).compute()
+        eager = np.concatenate([np.split(square.compute(), 3)[0], np.split(square.compute(), 2)[1],
+                                np.split(square.compute(), 3)[2]])
+        self.assertEqual(mixed.shape, (7, 6))
+        np.testing.assert_array_equal(mixed, eager)
+
+    def test_shared_nodes_are_not_overwritten(self):
+        shifted = self.source + 1
+        both = concatenate([shifted * 2, shifted + 0])
+        np.testing.assert_array_equal(both.compute(),
+                                      np.concatenate([(self.array + 1) * 2, self.array + 1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import unittest
+import numpy as np
+from tasks.sketches import CountMinSketch, HeavyHitters, HyperLogLog, QuantileSketch
+
+
+class TestQuantileSketch(unittest.TestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(42).normal(0, 100, 10001)
+        self.sketch = QuantileSketch(relative_accuracy=0.01)
+        self.sketch.update(self.values)
+
+    def test_count(self):
+        self.assertEqual(self.sketch.count, 10001)
+
+    def test_quantiles_within_relative_accuracy(self):
+        for q in [0, 0.1, 0.5, 0.9, 1]:
+            expected = np.quantile(self.values, q, method='lower')
+            self.assertLessEqual(abs(self.sketch.quantile(q) - expected), 0.01 * abs(expected))
+
+    def test_merge(self):
+        first, second = QuantileSketch(0.01), QuantileSketch(0.01)
+        first.update(self.values[:5000])
+        second.update(np.concatenate((self.values[5000:], [0.0, np.nan])))
+        first.merge(second)
+        self.assertEqual(first.count, 10002)
+        self.assertAlmostEqual(first.quantile(0.5), self.sketch.quantile(0.5), delta=0.02 * abs(self.sketch.quantile(0.5)))
+        with self.assertRaises(ValueError):
+            first.merge(QuantileSketch(0.05))
+
+    def test_empty_sketch(self):
+        self.assertTrue(np.isnan(QuantileSketch().quantile(0.5)))
+
+
+class TestHyperLogLog(unittest.TestCase):
+    def test_count_within_error(self):
+        ids = np.random.default_rng(1).integers(-10 ** 15, 10 ** 15, 200000)
+        sketch = HyperLogLog()
+        sketch.update(ids)
+        sketch.update(ids[:1000])
+        self.assertLessEqual(abs(sketch.count() - len(np.unique(ids))), 3 * sketch.standard_error * len(ids))
+
+    def test_small_counts_are_exact(self):
+        sketch = HyperLogLog()
+        sketch.update(np.arange(100) % 40)
+        self.assertEqual(sketch.count(), 40)
+        self.assertEqual(HyperLogLog().count(), 0)
+
+    def test_merge(self):
+        ids = np.arange(50000) * 7919
+        whole, first, second = HyperLogLog(12), HyperLogLog(12), HyperLogLog(12)
+        whole.update(ids)
+        first.update(ids[:30000])
+        second.update(ids[20000:])
+        first.merge(second)
+        self.assertEqual(first.count(), whole.count())
+        with self.assertRaises(ValueError):
+            first.merge(HyperLogLog(10))
+        with self.assertRaises(ValueError):
+            HyperLogLog(3)
+
+
+class TestCountMinSketch(unittest.TestCase):
+    def test_estimates_are_bounded(self):
+        ids = np.random.default_rng(2).zipf(1.5, 100000) % 10 ** 6
+        sketch = CountMinSketch(epsilon=0.001, delta=0.01)
+        sketch.update(ids[:60000])
+        other = CountMinSketch(epsilon=0.001, delta=0.01)
+        other.update(ids[60000:], counts=np.full(40000, 2))
+        sketch.merge(other)
+        self.assertEqual(sketch.total, 140000)
+
+        keys = np.unique(ids)[:100]
+        true_counts = np.array([np.count_nonzero(ids[:60000] == key) + 2 * np.count_nonzero(ids[60000:] == key)
+                                for key in keys])
+        estimates = sketch.estimate(keys)
+        self.assertTrue(np.all(estimates >= true_counts))
+        self.assertLessEqual(np.count_nonzero(estimates > true_counts + sketch.error_bound()), 1)
+        with self.assertRaises(ValueError):
+            sketch.merge(CountMinSketch(epsilon=0.01))
+
+
+class TestHeavyHitters(unittest.TestCase):
+    def test_top_items_with_bounds(self):
+        ids = np.random.default_rng(3).zipf(1.3, 100000) % 10 ** 6
+        true_counts = dict(zip(*np.unique(ids, return_counts=True)))
+        sketch = HeavyHitters(capacity=50)
+        for chunk in np.array_split(ids, 7):
+            partial = HeavyHitters(capacity=50)
+            partial.update(chunk)
+            sketch.merge(partial)
+        self.assertEqual(sketch.total, len(ids))
+        self.assertLessEqual(sketch.error_bound(), len(ids) / 51)
+
+        keys, counts = sketch.top()
+        self.assertLessEqual(len(keys), 50)
+        for key, count in zip(keys, counts):
+            self.assertLessEqual(count, true_counts[key])
+            self.assertLessEqual(true_counts[key], count + sketch.error_bound())
+        frequent = [key for key, count in true_counts.items() if count > len(ids) / 51]
+        self.assertTrue(set(frequent) <= set(keys.tolist()))
+        self.assertEqual(sketch.top(1)[0][0], max(true_counts, key=true_counts.get))
+
+    def test_weighted_counts_are_exact_within_capacity(self):
+        sketch = HeavyHitters(capacity=10)
+        sketch.update([5, 3, 5, 9], counts=[2, 7, 4, 1])
+        keys, counts = sketch.top()
+        np.testing.assert_array_equal(keys, [3, 5, 9])
+        np.testing.assert_array_equal(counts, [7, 6, 1])
+        self.assertEqual(sketch.error_bound(), 0)
+        with self.assertRaises(ValueError):
+            sketch.update([1, 2], counts=[1])
+
+
+if __name__ == '__main__':
+    unittest.main()